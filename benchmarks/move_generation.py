@@ -0,0 +1,93 @@
+"""Compare the ray-table move generator with the original per-call implementation.
+
+Run from the repository root:  python -m benchmarks.move_generation
+"""
+import sys
+import time
+from movement_patterns import get_valid_moves
+from benchmarks.positions import random_position
+
+SIZES = (4, 9, 13, 19)
+POSITIONS_PER_SIZE = 20
+REPEATS = 50
+
+
+def reference_get_valid_moves(piece, x, y, board):
+    """The original get_valid_moves, regrouping and sorting the movement set on every call"""
+    moves_by_direction = {}
+    for dx, dy in piece.movement_squares:
+        if dx != 0:
+            dx_norm = dx // abs(dx)
+        else:
+            dx_norm = 0
+        if dy != 0:
+            dy_norm = dy // abs(dy)
+        else:
+            dy_norm = 0
+        direction = (dx_norm, dy_norm)
+
+        if direction not in moves_by_direction:
+            moves_by_direction[direction] = []
+        moves_by_direction[direction].append((dx, dy))
+
+    valid_moves = []
+    for direction, moves in moves_by_direction.items():
+        moves.sort(key=lambda m: abs(m[0]) + abs(m[1]))
+
+        for dx, dy in moves:
+            move_x, move_y = x + dx, y + dy
+
+            if not (0 <= move_x < board.size and 0 <= move_y < board.size):
+                break
+
+            target_piece = board.get_piece((move_x, move_y))
+            if target_piece is None:
+                valid_moves.append((move_x, move_y))
+            elif target_piece.owner != piece.owner:
+                if not (piece.name == "advisor" and not piece.promoted):
+                    valid_moves.append((move_x, move_y))
+                break
+            else:
+                break
+
+    return valid_moves
+
+
+def _time_calls(function, calls):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for piece, x, y, board in calls:
+            function(piece, x, y, board)
+    return (time.perf_counter() - start) / (REPEATS * len(calls))
+
+
+def run():
+    mismatches = 0
+    print(f"{'size':>4} {'calls':>6} {'original us':>12} {'rays us':>9} {'speedup':>8}")
+
+    for size in SIZES:
+        calls = []
+        for seed in range(POSITIONS_PER_SIZE):
+            board, _ = random_position(size, seed)
+            for y, row in enumerate(board.board):
+                for x, piece in enumerate(row):
+                    if piece is not None:
+                        calls.append((piece, x, y, board))
+
+        for piece, x, y, board in calls:
+            if get_valid_moves(piece, x, y, board) != reference_get_valid_moves(piece, x, y, board):
+                mismatches += 1
+
+        # Build the tables before timing so only the lookups are measured
+        _time_calls(get_valid_moves, calls[:1])
+        original = _time_calls(reference_get_valid_moves, calls)
+        rays = _time_calls(get_valid_moves, calls)
+        print(f"{size:>4} {len(calls):>6} {original * 1e6:>12.2f} {rays * 1e6:>9.2f} {original / rays:>7.1f}x")
+
+    if mismatches:
+        print(f"{mismatches} positions gave different moves")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,23 @@
+import random
+from board import Board
+from reserve_manager import ReserveManager
+
+
+def random_position(size, seed=0, fill=0.7):
+    """Board with a random share of both players' starting reserves scattered over it"""
+    rng = random.Random(seed)
+    board = Board(size, None)
+    reserve_manager = ReserveManager()
+
+    for player, pieces in reserve_manager.reserves.items():
+        for piece in list(pieces):
+            if rng.random() >= fill:
+                continue
+            # Retry a few times so crowded small boards still get most pieces
+            for _ in range(10):
+                if board.place_piece(piece, (rng.randrange(size), rng.randrange(size))):
+                    reserve_manager.remove_piece(player, pieces.index(piece))
+                    break
+
+    board.check_all_pieces_status()
+    return board, reserve_manager
@@ -0,0 +1,338 @@
+"""Time each subsystem at every board size the menu can offer.
+
+For each size a few mid-game positions are built and these stages are timed, in
+microseconds per position:
+
+    move_generation   every board move of both players
+    status_check      check_all_pieces_status(full=True)
+    placement         drop squares for each piece type of both players
+    serialisation     NetworkManager's framed JSON round trip of the whole game state
+    rendering         drawing the board and its pieces (needs the textures)
+
+Results are compared with benchmarks/scaling_baseline.json and the exit status is 1
+when a stage got slower than the baseline by more than the tolerance. Absolute
+timings only hold on the machine that recorded them, so every run also times a
+fixed reference workload before each size and the baseline is scaled by how much
+faster or slower the best of those ran than when the baseline was stored. A stage
+that still looks slower is timed again in up to CONFIRM_RUNS new processes, and
+only reported if it is slower in every one of them. Timings move between processes
+with object layout, which follows the string hash seed among other things, so the
+benchmark always runs under HASH_SEED and a slow process alone isn't a regression.
+
+Run from the repository root:  python -m benchmarks.scaling [--update] [--sizes N ...]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from constants import MIN_BOARD_SIZE, MAX_BOARD_SIZE, PLAYER_1, PLAYER_2
+from movement_patterns import get_valid_moves, get_valid_placement_squares
+from piece import Piece, movement_for
+from zobrist import position_key
+from benchmarks.positions import random_position
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "scaling_baseline.json")
+STAGES = ("move_generation", "status_check", "placement", "serialisation", "rendering")
+POSITIONS_PER_SIZE = 3
+ROUNDS = 5
+ROUND_SECONDS = 0.02
+DEFAULT_TOLERANCE = 0.5
+CONFIRM_RUNS = 3
+HASH_SEED = "0"
+
+# Nothing is shown or played, so don't open a window or an audio device
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+class _BenchmarkGame:
+    """The parts of Game that NetworkManager reads and writes"""
+
+    def __init__(self, board, reserve_manager):
+        self.board = board
+        self.reserve_manager = reserve_manager
+        self.current_player = PLAYER_1
+        self.monarchs_placed = {PLAYER_1: True, PLAYER_2: True}
+        self.game_phase = "playing"
+        self.current_state = "game"
+        self.winner = None
+        self.i_promoted = False
+
+    def get_position_key(self):
+        return position_key(self.board, self.reserve_manager, self.current_player, self.game_phase)
+
+
+def _time_per_call(function):
+    """Best of ROUNDS timings, each repeating function until it takes ROUND_SECONDS"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= ROUND_SECONDS:
+            break
+        number *= 2
+
+    best = elapsed / number
+    for _ in range(ROUNDS - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _reference():
+    """Pure Python busywork that none of the game's code touches, timed to scale the baseline"""
+    table = {}
+    for i in range(2000):
+        table[i % 97] = table.get(i % 97, 0) + i * i
+    return sorted(table.values())
+
+
+def _move_generation(positions):
+    boards = [board for board, _ in positions]
+
+    def generate():
+        for board in boards:
+            for y, row in enumerate(board.board):
+                for x, piece in enumerate(row):
+                    if piece is not None:
+                        get_valid_moves(piece, x, y, board)
+    return generate
+
+
+def _status_check(positions):
+    boards = [board for board, _ in positions]
+
+    def check():
+        for board in boards:
+            board.check_all_pieces_status(full=True)
+    return check
+
+
+def _placement(positions):
+    boards = [board for board, _ in positions]
+    pieces = [Piece(name, movement_for(name), player)
+              for player in (PLAYER_1, PLAYER_2)
+              for name in ("monarch", "advisor", "official", "palace", "spy")]
+
+    def place():
+        for board in boards:
+            for piece in pieces:
+                get_valid_placement_squares(board, piece)
+    return place
+
+
+def _serialisation(positions):
+    from network_manager import NetworkManager
+    from protocol import FrameDecoder, decode_message, encode_message
+    managers = [NetworkManager(_BenchmarkGame(board, reserve_manager)) for board, reserve_manager in positions]
+
+    def round_trip():
+        # update_game_state reports what it received on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            for manager in managers:
+                data = encode_message(manager.serialize_game_state())
+                for payload in FrameDecoder().feed(data):
+                    manager.update_game_state(decode_message(payload))
+    return round_trip
+
+
+def _rendering(positions):
+    import pygame
+    from display_manager import DisplayManager
+    from draw import GameDrawUtilities
+    pygame.init()
+    display = DisplayManager()
+    screen = display.get_screen()
+    drawers = [GameDrawUtilities(display, board) for board, _ in positions]
+
+    def render():
+        for drawer in drawers:
+            drawer.draw_board(screen)
+            drawer.draw_board_pieces(screen)
+    return render
+
+
+_STAGE_BUILDERS = {
+    "move_generation": _move_generation,
+    "status_check": _status_check,
+    "placement": _placement,
+    "serialisation": _serialisation,
+    "rendering": _rendering,
+}
+
+
+def _positions(size):
+    return [random_position(size, seed) for seed in range(POSITIONS_PER_SIZE)]
+
+
+def measure(stage, positions):
+    """Microseconds per position of one stage, None if it can't run here"""
+    try:
+        function = _STAGE_BUILDERS[stage](positions)
+    except (FileNotFoundError, ImportError) as e:
+        # Rendering needs the game's textures and pygame's display
+        print(f"Skipping {stage} at size {positions[0][0].size}: {e}", file=sys.stderr)
+        return None
+    return round(_time_per_call(function) / len(positions) * 1e6, 2)
+
+
+def measure_reference():
+    return round(_time_per_call(_reference) * 1e6, 2)
+
+
+def run(sizes, stages=STAGES, references=None):
+    """{stage: {size: microseconds per position, or None if the stage can't run here}}
+
+    A reference timing is appended to references, if given, before each size.
+    """
+    results = {stage: {} for stage in stages}
+    print(f"{'size':>4} " + " ".join(f"{stage:>16}" for stage in stages) + "   (us per position)")
+
+    for size in sizes:
+        if references is not None:
+            references.append(measure_reference())
+        positions = _positions(size)
+
+        cells = []
+        for stage in stages:
+            microseconds = measure(stage, positions)
+            results[stage][str(size)] = microseconds
+            cells.append(f"{'-':>16}" if microseconds is None else f"{microseconds:>16.1f}")
+        print(f"{size:>4} " + " ".join(cells))
+
+    return results
+
+
+def machine_info():
+    """What the timings depend on besides the code, stored with the baseline"""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance, scale=1.0):
+    """Every (stage, size, expected, current) slower than the baseline * scale * (1 + tolerance).
+
+    scale is the current reference timing over the baseline's, 2.0 on a machine half as fast.
+    """
+    regressions = []
+    for stage, by_size in results.items():
+        for size, current in by_size.items():
+            expected = baseline.get(stage, {}).get(size)
+            if current is None or expected is None:
+                continue
+            expected *= scale
+            if current > expected * (1 + tolerance):
+                regressions.append((stage, size, expected, current))
+    return regressions
+
+
+def confirm(regressions, baseline, tolerance, runs=CONFIRM_RUNS):
+    """The regressions that are still too slow in each of up to runs fresh processes.
+
+    Every process times the reference again, and its own figure scales the baseline.
+    """
+    confirmed = []
+    for stage, size, expected, current in regressions:
+        for _ in range(runs):
+            report = _measure_in_subprocess(stage, size)
+            expected = baseline["results"][stage][size] * report["reference_us"] / baseline["reference_us"]
+            current = report["results"][stage][size]
+            if current <= expected * (1 + tolerance):
+                break
+        else:
+            confirmed.append((stage, size, expected, current))
+    return confirmed
+
+
+def _measure_in_subprocess(stage, size):
+    """The report of timing one stage at one size in a new process"""
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        subprocess.run([sys.executable, "-m", "benchmarks.scaling", "--no-check", "--output", path,
+                        "--sizes", size, "--stages", stage], stdout=subprocess.DEVNULL, check=True)
+        with open(path) as report_file:
+            return json.load(report_file)
+    finally:
+        os.remove(path)
+
+
+def load_baseline():
+    """The stored baseline report, empty if there is none"""
+    try:
+        with open(BASELINE_PATH) as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv=None):
+    if os.environ.get("PYTHONHASHSEED") != HASH_SEED:
+        # Start again under the fixed seed, see the module docstring
+        argv = sys.argv[1:] if argv is None else argv
+        env = dict(os.environ, PYTHONHASHSEED=HASH_SEED)
+        return subprocess.call([sys.executable, "-m", "benchmarks.scaling", *argv], env=env)
+
+    parser = argparse.ArgumentParser(description="Time Seiji's subsystems at every board size")
+    parser.add_argument("--sizes", type=int, nargs="*",
+                        default=list(range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1)))
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown over the baseline, 0.5 meaning 50%% slower")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--no-check", action="store_true", help="don't compare the results with the baseline")
+    args = parser.parse_args(argv)
+
+    references = []
+    results = run(args.sizes, args.stages, references)
+    references.append(measure_reference())
+    reference = min(references)
+    report = dict(machine_info(), reference_us=reference, results=results)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=1)
+            output_file.write("\n")
+
+    if args.update:
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=1)
+            baseline_file.write("\n")
+        print(f"Updated {BASELINE_PATH}")
+        return 0
+
+    baseline = load_baseline()
+    if args.no_check or not baseline:
+        return 0
+    scale = reference / baseline["reference_us"]
+    if any(baseline.get(key) != value for key, value in machine_info().items()):
+        print(f"The baseline was recorded on {baseline.get('platform')} ({baseline.get('processor') or baseline.get('machine')}, "
+              f"Python {baseline.get('python')}), timings are only compared through the reference workload")
+    print(f"Reference workload took {reference:.1f} us, {scale:.2f}x the baseline's")
+
+    regressions = compare(results, baseline["results"], args.tolerance, scale)
+    regressions = confirm(regressions, baseline, args.tolerance)
+    for stage, size, expected, current in regressions:
+        print(f"Regression: {stage} at size {size} took {current:.1f} us, expected {expected:.1f} us")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Compare the JSON and binary encodings of a snapshot at every board size.
+
+For each size a few mid-game positions are serialised the way NetworkManager does
+and both encodings are measured: frame size in bytes and microseconds to encode
+the state dict into a frame and to decode the frame's payload back into a message.
+
+Run from the repository root:  python -m benchmarks.snapshot_encoding [--sizes N ...]
+"""
+import argparse
+import json
+import sys
+from constants import MIN_BOARD_SIZE, MAX_BOARD_SIZE
+from protocol import LENGTH, decode_message, encode_snapshot
+from benchmarks.positions import random_position
+from benchmarks.scaling import POSITIONS_PER_SIZE, _BenchmarkGame, _time_per_call
+
+FORMATS = {"json": False, "binary": True}
+
+
+def _measure(states, binary):
+    frames = [encode_snapshot(seq, state, binary=binary) for seq, state in enumerate(states, 1)]
+    payloads = [frame[LENGTH.size:] for frame in frames]
+
+    def encode():
+        for seq, state in enumerate(states, 1):
+            encode_snapshot(seq, state, binary=binary)
+
+    def decode():
+        for payload in payloads:
+            decode_message(payload)
+
+    count = len(states)
+    return {
+        "bytes": round(sum(map(len, frames)) / count),
+        "encode_us": round(_time_per_call(encode) / count * 1e6, 2),
+        "decode_us": round(_time_per_call(decode) / count * 1e6, 2),
+    }
+
+
+def run(sizes):
+    """{size: {format: {"bytes", "encode_us", "decode_us"}}}, averaged over the positions of a size"""
+    from network_manager import NetworkManager
+    results = {}
+    print(f"{'size':>4} {'json B':>8} {'binary B':>8} {'json enc':>9} {'bin enc':>9} "
+          f"{'json dec':>9} {'bin dec':>9}   (us per snapshot)")
+
+    for size in sizes:
+        states = [NetworkManager(_BenchmarkGame(*random_position(size, seed))).serialize_game_state()
+                  for seed in range(POSITIONS_PER_SIZE)]
+        by_format = {name: _measure(states, binary) for name, binary in FORMATS.items()}
+        results[str(size)] = by_format
+        json_row, binary_row = by_format["json"], by_format["binary"]
+        print(f"{size:>4} {json_row['bytes']:>8} {binary_row['bytes']:>8} "
+              f"{json_row['encode_us']:>9.1f} {binary_row['encode_us']:>9.1f} "
+              f"{json_row['decode_us']:>9.1f} {binary_row['decode_us']:>9.1f}")
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare Seiji's JSON and binary snapshot encodings")
+    parser.add_argument("--sizes", type=int, nargs="*",
+                        default=list(range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1)))
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=1)
+            output_file.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
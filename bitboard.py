@@ -0,0 +1,77 @@
+from constants import PALACE_AREA
+from piece import intern_movement, is_interned
+
+# Square (x, y) lives at bit y * size + x. Masks depend only on the board size,
+# so they are built once per size and shared by every Board of that size.
+_MASKS_BY_SIZE = {}
+
+
+def iter_bits(mask):
+    """Yield the index of every set bit, lowest first"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BoardMasks:
+    def __init__(self, size):
+        self.size = size
+        self.full = (1 << (size * size)) - 1
+
+        center = size // 2
+        self.center = 1 << (center * size + center)
+
+        self.neighbours = []
+        self.palace_areas = []
+        reach = PALACE_AREA // 2
+        for y in range(size):
+            for x in range(size):
+                self.neighbours.append(self._mask_of(
+                    [(x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)]))
+                self.palace_areas.append(self._mask_of(
+                    [(x + dx, y + dy) for dy in range(-reach, reach + 1) for dx in range(-reach, reach + 1)]))
+
+        # id of interned movement set -> one target mask per square
+        self._jump_masks = {}
+
+    def _mask_of(self, squares):
+        mask = 0
+        for x, y in squares:
+            if 0 <= x < self.size and 0 <= y < self.size:
+                mask |= 1 << (y * self.size + x)
+        return mask
+
+    def index(self, position):
+        x, y = position
+        return y * self.size + x
+
+    def position(self, index):
+        return index % self.size, index // self.size
+
+    def squares(self, mask):
+        size = self.size
+        return [(index % size, index // size) for index in iter_bits(mask)]
+
+    def jump_masks(self, movement_squares):
+        """Per-square masks of every in-bounds target of a movement set, ignoring blockers"""
+        try:
+            return self._jump_masks[id(movement_squares)]
+        except KeyError:
+            movement_squares = intern_movement(movement_squares)
+            masks = self._jump_masks.get(id(movement_squares))
+            if masks is None:
+                size = self.size
+                masks = [self._mask_of([(x + dx, y + dy) for dx, dy in movement_squares])
+                         for y in range(size) for x in range(size)]
+                # Only the shared sets live long enough for their id to be a safe key
+                if is_interned(movement_squares):
+                    self._jump_masks[id(movement_squares)] = masks
+            return masks
+
+
+def masks_for(size) -> BoardMasks:
+    masks = _MASKS_BY_SIZE.get(size)
+    if masks is None:
+        masks = _MASKS_BY_SIZE[size] = BoardMasks(size)
+    return masks
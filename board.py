@@ -1,14 +1,72 @@
-import pygame
-from sound_manager import SoundManager
+from bitboard import masks_for, iter_bits
+from constants import PLAYER_1, PLAYER_2
+from movement_patterns import get_ray_table
+from piece import movement_for
+from zobrist import piece_key
 
 
 class Board:
     def __init__(self, size, game):
-        SoundManager()
         self.game = game
         self.size = size
         self.board = [[None for x in range(size)] for y in range(size)]
         self.i_promoted = False
+        # Called on the first promotion of a turn, the GUI hooks its sound up here
+        self.on_promote = None
+        # When set, every incremental status check is compared against a full rescan
+        self.verify_status = False
+        # Optional MoveCache used by movement_patterns, see enable_move_cache
+        self.move_cache = None
+        self._reset_storage()
+
+    def _reset_storage(self):
+        # The grid above keeps the Piece objects; these integer masks mirror it per
+        # (owner, name) and per owner so rules queries can work on whole sets of squares.
+        self.masks = masks_for(self.size)
+        self.piece_masks = {}
+        self.owner_masks = {}
+        self.occupied = 0
+        # Zobrist key of the pieces on the board, see zobrist.position_key
+        self.zobrist = 0
+        # Per owner, how many pieces could drop-cover each square (the targets of their
+        # movement set, or the area around a palace) and the mask of squares covered at all
+        self.coverage = {}
+        self.coverage_masks = {}
+        # Per square, the squares the piece there attacks: its rays up to and including
+        # the first piece on each, or nothing for a piece that can't capture. attackers
+        # is the reverse, per square the mask of squares holding a piece that attacks it.
+        # Pieces in attack_dirty are brought up to date on the next query
+        self.attack_masks = [0] * (self.size * self.size)
+        self.attackers = [0] * (self.size * self.size)
+        self.attack_dirty = 0
+        # Squares whose promotion status may have changed since the last check
+        self.dirty = 0
+        # One entry per make_move, popped by unmake_move
+        self.undo_stack = []
+        # Status changes made while a move is being applied, see make_move
+        self._status_journal = None
+
+    def __getstate__(self):
+        # Masks are shared per board size and the callback belongs to whoever owns the
+        # board, neither should travel to another process
+        state = self.__dict__.copy()
+        del state['masks']
+        state['on_promote'] = None
+        state['move_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.masks = masks_for(self.size)
+
+    def enable_move_cache(self, maxsize=4096):
+        """Memoise get_valid_moves and get_valid_placement_squares for this board"""
+        from move_cache import MoveCache
+        self.move_cache = MoveCache(maxsize)
+        return self.move_cache
+
+    def disable_move_cache(self):
+        self.move_cache = None
 
     def get_size(self) -> int:
         return self.size
@@ -16,11 +74,173 @@ class Board:
     def wipe_board(self):
         size = self.get_size()
         self.board = [[None for x in range(size)] for y in range(size)]
+        self._reset_storage()
+
+    def load_grid(self, grid):
+        """Replace the whole board with a grid of pieces, e.g. one received over the network"""
+        self.board = grid
+        self._reset_storage()
+        for y, row in enumerate(grid):
+            for x, piece in enumerate(row):
+                if piece is not None:
+                    self._set_bits(piece, x, y)
+        self.dirty = self.occupied
+
+    def _mark_dirty(self, x, y):
+        # Status only depends on the orthogonal neighbours, so a change here can
+        # only affect this square and the four around it
+        index = y * self.size + x
+        self.dirty |= (1 << index) | self.masks.neighbours[index]
+
+    def _set_bits(self, piece, x, y):
+        bit = 1 << (y * self.size + x)
+        key = (piece.owner, piece.name)
+        self.piece_masks[key] = self.piece_masks.get(key, 0) | bit
+        self.owner_masks[piece.owner] = self.owner_masks.get(piece.owner, 0) | bit
+        self.occupied |= bit
+        self.zobrist ^= piece_key(x, y, piece.owner, piece.name, piece.promoted)
+        self._add_coverage(piece.owner, self._cover_mask(piece, x, y, piece.movement_squares))
+        # The new piece blocks every ray that reached this square
+        self.attack_dirty |= bit | self.attackers[y * self.size + x]
+
+    def _clear_bits(self, piece, x, y):
+        bit = 1 << (y * self.size + x)
+        key = (piece.owner, piece.name)
+        self.piece_masks[key] &= ~bit
+        self.owner_masks[piece.owner] &= ~bit
+        self.occupied &= ~bit
+        self.zobrist ^= piece_key(x, y, piece.owner, piece.name, piece.promoted)
+        self._remove_coverage(piece.owner, self._cover_mask(piece, x, y, piece.movement_squares))
+        # Rays that stopped here now carry on past this square
+        index = y * self.size + x
+        if self.attack_masks[index]:
+            self._set_attacks(index, 0)
+        self.attack_dirty = (self.attack_dirty | self.attackers[index]) & ~bit
+
+    def _cover_mask(self, piece, x, y, movement_squares):
+        if piece.name == "spy":
+            return 0
+        if piece.name == "palace":
+            return self.masks.palace_areas[y * self.size + x]
+        return self.masks.jump_masks(movement_squares)[y * self.size + x]
+
+    def _add_coverage(self, owner, mask):
+        counts = self.coverage.get(owner)
+        if counts is None:
+            counts = self.coverage[owner] = [0] * (self.size * self.size)
+        newly_covered = 0
+        for index in iter_bits(mask):
+            if not counts[index]:
+                newly_covered |= 1 << index
+            counts[index] += 1
+        self.coverage_masks[owner] = self.coverage_masks.get(owner, 0) | newly_covered
+
+    def _remove_coverage(self, owner, mask):
+        counts = self.coverage[owner]
+        uncovered = 0
+        for index in iter_bits(mask):
+            counts[index] -= 1
+            if not counts[index]:
+                uncovered |= 1 << index
+        self.coverage_masks[owner] &= ~uncovered
+
+    def _movement_changed(self, piece, x, y, old_movement_squares):
+        self._remove_coverage(piece.owner, self._cover_mask(piece, x, y, old_movement_squares))
+        self._add_coverage(piece.owner, self._cover_mask(piece, x, y, piece.movement_squares))
+        self.attack_dirty |= 1 << (y * self.size + x)
+
+    def _attack_mask(self, piece, index):
+        # Unpromoted advisors can't capture, as in movement_patterns.get_valid_moves
+        if piece.name == "advisor" and not piece.promoted:
+            return 0
+        size = self.size
+        grid = self.board
+        mask = 0
+        for ray in get_ray_table(piece.movement_squares, size)[index]:
+            for x, y in ray:
+                mask |= 1 << (y * size + x)
+                if grid[y][x] is not None:
+                    break
+        return mask
+
+    def _set_attacks(self, index, mask):
+        old = self.attack_masks[index]
+        if mask == old:
+            return
+        attackers = self.attackers
+        bit = 1 << index
+        for target in iter_bits(old & ~mask):
+            attackers[target] &= ~bit
+        for target in iter_bits(mask & ~old):
+            attackers[target] |= bit
+        self.attack_masks[index] = mask
+
+    def _refresh_attacks(self):
+        squares = self.attack_dirty & self.occupied
+        self.attack_dirty = 0
+        size = self.size
+        for index in iter_bits(squares):
+            self._set_attacks(index, self._attack_mask(self.board[index // size][index % size], index))
+
+    def attackers_of(self, position, owner) -> list[tuple[int, int]]:
+        """Squares of owner's pieces that could capture on position if an enemy stood there"""
+        self._refresh_attacks()
+        x, y = position
+        return self.masks.squares(self.attackers[y * self.size + x] & self.get_owner_mask(owner))
+
+    def is_attacked(self, position, owner) -> bool:
+        """Whether any of owner's pieces could capture on position"""
+        self._refresh_attacks()
+        x, y = position
+        return bool(self.attackers[y * self.size + x] & self.get_owner_mask(owner))
+
+    def is_monarch_attacked(self, owner) -> bool:
+        """Whether an enemy piece could take owner's monarch right now"""
+        monarch = self.get_piece_mask(owner, "monarch")
+        if not monarch:
+            return False
+        self._refresh_attacks()
+        enemies = self.occupied & ~self.get_owner_mask(owner)
+        for index in iter_bits(monarch):
+            if self.attackers[index] & enemies:
+                return True
+        return False
+
+    def get_attack_mask(self, owner) -> int:
+        """Every square owner's pieces attack"""
+        self._refresh_attacks()
+        mask = 0
+        for index in iter_bits(self.get_owner_mask(owner)):
+            mask |= self.attack_masks[index]
+        return mask
+
+    def get_coverage_mask(self, owner) -> int:
+        """Squares a reserve piece of owner could be dropped on if they were empty"""
+        return self.coverage_masks.get(owner, 0)
+
+    def get_piece_mask(self, owner, name) -> int:
+        return self.piece_masks.get((owner, name), 0)
+
+    def get_owner_mask(self, owner) -> int:
+        return self.owner_masks.get(owner, 0)
+
+    def find_piece(self, piece):
+        """Return the position of a piece on the board, or None if it isn't on it"""
+        size = self.size
+        for index in iter_bits(self.get_piece_mask(piece.owner, piece.name)):
+            x, y = index % size, index // size
+            if self.board[y][x] is piece:
+                return x, y
+        return None
 
     def get_adjacent_pieces(self, position) -> dict[str, list[None]]:
         x, y = position
         adjacent_pieces = {}
 
+        # Most squares have no neighbours at all, skip the lookups for those
+        if not self.masks.neighbours[y * self.size + x] & self.occupied:
+            return adjacent_pieces
+
         # Define positions with their labels
         adjacent_positions = {
             'up': (x, y - 1),
@@ -39,18 +259,11 @@ class Board:
 
     def handle_status(self, piece, adjacent_pieces):
 
-        DEFAULT_MOVEMENTS = {
-            "monarch": ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)),
-            "advisor": ((3, 3), (3, -3), (-3, 3), (-3, -3), (2, 2), (2, -2), (-2, 2), (-2, -2), (1, 1), (1, -1),
-                        (-1, 1), (-1, -1)),
-            "official": ((0, 1), (0, -1), (1, 0), (-1, 0))
-        }
-
         # If no adjacent pieces, demote and reset movements
         if not adjacent_pieces:
             if piece.promoted:
                 piece.promoted = False
-                piece.movement_squares = DEFAULT_MOVEMENTS[piece.name]
+                piece.movement_squares = movement_for(piece.name)
             return
 
         if piece.promoted:
@@ -59,15 +272,15 @@ class Board:
                     p.name == "monarch" and p.owner == piece.owner for p in adjacent_pieces.values())
                 if not has_friendly_monarch:
                     piece.promoted = False
-                    piece.movement_squares = DEFAULT_MOVEMENTS["advisor"]
+                    piece.movement_squares = movement_for("advisor")
             if piece.name == "official":
                 if any(p.name == "monarch" and p.owner == piece.owner for p in adjacent_pieces.values()):
-                    piece.movement_squares = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+                    piece.movement_squares = movement_for("official", "monarch")
                 elif any(p.name == "advisor" and p.owner == piece.owner for p in adjacent_pieces.values()):
-                    piece.movement_squares = ((0, 1), (0, -1), (1, 0), (-1, 0), (0, 2), (0, -2), (2, 0), (-2, 0))
+                    piece.movement_squares = movement_for("official", "advisor")
                 else:
                     piece.promoted = False
-                    piece.movement_squares = DEFAULT_MOVEMENTS["official"]
+                    piece.movement_squares = movement_for("official")
             return
 
         else:
@@ -80,71 +293,175 @@ class Board:
 
                 # Only promote if there are friendly pieces, no enemy pieces, and no friendly palace
                 if has_only_friendly_adjacent and has_any_friendly_adjacent and not has_friendly_palace:
-                    if not self.i_promoted:  # Only play sound once per turn
-                        SoundManager.play_sound('promote')
-                        self.i_promoted = True
+                    self._announce_promotion()
                     piece.promoted = True
-                    piece.movement_squares = ((2, 2), (2, -2), (-2, 2), (-2, -2), (0, 2), (0, -2), (2, 0), (-2, 0),
-                                              (0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+                    piece.movement_squares = movement_for("monarch", "promoted")
             elif piece.name == "advisor":
                 has_friendly_monarch = any(
                     p.name == "monarch" and p.owner == piece.owner for p in adjacent_pieces.values())
                 if has_friendly_monarch:
-                    if not self.i_promoted:  # Only play sound once per turn
-                        SoundManager.play_sound('promote')
-                        self.i_promoted = True
+                    self._announce_promotion()
                     piece.promoted = True
-                    piece.movement_squares = ((2, 2), (2, -2), (-2, 2), (-2, -2), (0, 2), (0, -2), (2, 0), (-2, 0),
-                                              (0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+                    piece.movement_squares = movement_for("advisor", "monarch")
             elif piece.name == "official":
                 if any(p.name == "monarch" and p.owner == piece.owner for p in adjacent_pieces.values()):
-                    if not self.i_promoted:  # Only play sound once per turn
-                        SoundManager.play_sound('promote')
-                        self.i_promoted = True
+                    self._announce_promotion()
                     piece.promoted = True
-                    piece.movement_squares = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+                    piece.movement_squares = movement_for("official", "monarch")
                 elif any(p.name == "advisor" and p.owner == piece.owner for p in adjacent_pieces.values()):
-                    if not self.i_promoted:  # Only play sound once per turn
-                        SoundManager.play_sound('promote')
-                        self.i_promoted = True
+                    self._announce_promotion()
                     piece.promoted = True
-                    piece.movement_squares = ((0, 1), (0, -1), (1, 0), (-1, 0), (0, 2), (0, -2), (2, 0), (-2, 0))
+                    piece.movement_squares = movement_for("official", "advisor")
+
+    def _announce_promotion(self):
+        if not self.i_promoted:  # Only announce once per turn
+            if self.on_promote is not None:
+                self.on_promote()
+            self.i_promoted = True
+
+    def check_all_pieces_status(self, full=False):
+        """Re-run handle_status for pieces near squares changed since the last call.
 
-    def check_all_pieces_status(self):
+        A piece's status only depends on the names and owners of its neighbours, never on
+        their promotion, so one pass over the dirty squares gives the same result as a
+        full rescan. Pass full=True to rescan every piece regardless.
+        """
         self.i_promoted = False
-        for y in range(self.size):
-            for x in range(self.size):
-                self._check_piece_at_position(x, y)
+        self._update_status(full)
+
+        if self.verify_status and not full:
+            self._verify_status()
+
+    def _update_status(self, full=False):
+        size = self.size
+        squares = self.occupied if full else self.dirty & self.occupied
+        self.dirty = 0
+        for index in iter_bits(squares):
+            self._check_piece_at_position(index % size, index // size)
+
+    def _verify_status(self):
+        pieces = [piece for row in self.board for piece in row if piece is not None]
+        expected = [(piece.promoted, tuple(piece.movement_squares)) for piece in pieces]
+
+        # Rescan without replaying the promotion sound
+        i_promoted = self.i_promoted
+        self.i_promoted = True
+        self.check_all_pieces_status(full=True)
+        self.i_promoted = i_promoted
+
+        for piece, status in zip(pieces, expected):
+            if status != (piece.promoted, tuple(piece.movement_squares)):
+                raise AssertionError(f"Incremental status check missed a change to {piece.name} "
+                                     f"at {self.find_piece(piece)}")
 
     def _check_piece_at_position(self, x, y):
         current_piece = self.get_piece((x, y))
         if current_piece is not None:
             adjacent_pieces = self.get_adjacent_pieces((x, y))
             if adjacent_pieces is not None:
+                promoted = current_piece.promoted
+                movement_squares = current_piece.movement_squares
                 self.handle_status(current_piece, adjacent_pieces)
+                if current_piece.promoted != promoted:
+                    self.attack_dirty |= 1 << (y * self.size + x)
+                    self.zobrist ^= (piece_key(x, y, current_piece.owner, current_piece.name, promoted) ^
+                                     piece_key(x, y, current_piece.owner, current_piece.name, current_piece.promoted))
+                if current_piece.movement_squares is not movement_squares:
+                    self._movement_changed(current_piece, x, y, movement_squares)
+                if self._status_journal is not None and (current_piece.promoted != promoted or
+                                                         current_piece.movement_squares is not movement_squares):
+                    self._status_journal.append((current_piece, x, y, promoted, movement_squares))
 
-    def get_board_position(self, mouse_pos, display_manager):
-        current_width, current_height = display_manager.get_dimensions()
-        desired_board_height = current_height * 0.8
-        cell_size = desired_board_height / self.size
-        board_pixels = self.size * cell_size
+    def _restore_status(self, piece, x, y, promoted, movement_squares):
+        if piece.promoted != promoted:
+            self.attack_dirty |= 1 << (y * self.size + x)
+            self.zobrist ^= (piece_key(x, y, piece.owner, piece.name, piece.promoted) ^
+                             piece_key(x, y, piece.owner, piece.name, promoted))
+        piece.promoted = promoted
+        if piece.movement_squares is not movement_squares:
+            old_movement_squares = piece.movement_squares
+            piece.movement_squares = movement_squares
+            self._movement_changed(piece, x, y, old_movement_squares)
 
-        # Calculate board rect
-        grid_rect = pygame.Rect(0, 0, board_pixels, board_pixels)
-        grid_rect.center = (current_width // 2, current_height // 2)
+    def make_move(self, move):
+        """Apply a move for the side to move of self.game and push what's needed to undo it.
 
-        # If click is outside board, return None
-        if not grid_rect.collidepoint(mouse_pos):
-            return None
+        self.game provides current_player, game_phase, monarchs_placed and reserve_manager.
+        The move isn't validated. Promotion status is settled afterwards. Returns the
+        captured piece, if any.
+        """
+        game = self.game
+        player = game.current_player
+        reserve_manager = game.reserve_manager
+        dirty = self.dirty
+        monarchs_placed = game.monarchs_placed
+        game_phase = game.game_phase
+        captured = None
+        captured_owner = None
+        reserve_index = None
 
-        # Calculate board coordinates
-        board_x = int((mouse_pos[0] - grid_rect.left) / cell_size)
-        board_y = int((mouse_pos[1] - grid_rect.top) / cell_size)
+        if move.origin is None:
+            pieces = reserve_manager.get_pieces(player)
+            reserve_index = next(i for i, piece in enumerate(pieces) if piece.name == move.piece_name)
+            piece = reserve_manager.remove_piece(player, reserve_index)
+            self.place_piece(piece, move.target)
 
-        # Ensure coordinates are within bounds
-        if 0 <= board_x < self.size and 0 <= board_y < self.size:
-            return board_x, board_y
-        return None
+            if piece.name == "monarch":
+                game.monarchs_placed = monarchs_placed.copy()
+                game.monarchs_placed[player] = True
+                if all(game.monarchs_placed.values()):
+                    game.game_phase = "playing"
+        else:
+            piece = self.remove_piece(move.origin)
+            captured = self.remove_piece(move.target)
+            self.place_piece(piece, move.target)
+
+            if captured is not None:
+                captured_owner = captured.owner
+                captured.owner = player
+                # A captured monarch ends the game instead of going to the reserve
+                if captured.name != "monarch":
+                    reserve_manager.add_piece(captured)
+
+        game.current_player = PLAYER_2 if player == PLAYER_1 else PLAYER_1
+
+        # Settle promotions now so they can be undone. This starts a new turn, so the
+        # promotion flag is reset like check_all_pieces_status does
+        self.i_promoted = False
+        self._status_journal = status_changes = []
+        self._update_status()
+        self._status_journal = None
+
+        self.undo_stack.append((move, piece, reserve_index, captured, captured_owner, status_changes,
+                                player, game_phase, monarchs_placed, dirty))
+        return captured
+
+    def unmake_move(self):
+        """Take back the last make_move, restoring the board, reserves and turn exactly"""
+        (move, piece, reserve_index, captured, captured_owner, status_changes,
+         player, game_phase, monarchs_placed, dirty) = self.undo_stack.pop()
+        game = self.game
+        reserve_manager = game.reserve_manager
+
+        # Statuses first, while the pieces are still on the squares they were recorded at
+        for changed_piece, x, y, promoted, movement_squares in reversed(status_changes):
+            self._restore_status(changed_piece, x, y, promoted, movement_squares)
+
+        self.remove_piece(move.target)
+        if move.origin is None:
+            reserve_manager.insert_piece(player, reserve_index, piece)
+        else:
+            self.place_piece(piece, move.origin)
+            if captured is not None:
+                if captured.name != "monarch":
+                    reserve_manager.remove_piece(player, len(reserve_manager.get_pieces(player)) - 1)
+                captured.owner = captured_owner
+                self.place_piece(captured, move.target)
+
+        game.current_player = player
+        game.game_phase = game_phase
+        game.monarchs_placed = monarchs_placed
+        self.dirty = dirty
 
     def place_piece(self, piece, position):
         x, y = position
@@ -155,6 +472,8 @@ class Board:
             return False
 
         self.board[y][x] = piece
+        self._set_bits(piece, x, y)
+        self._mark_dirty(x, y)
         return True
 
     def remove_piece(self, position):
@@ -162,6 +481,9 @@ class Board:
         if 0 <= x < self.size and 0 <= y < self.size:
             piece = self.board[y][x]
             self.board[y][x] = None
+            if piece is not None:
+                self._clear_bits(piece, x, y)
+                self._mark_dirty(x, y)
             return piece
         return None
 
@@ -175,16 +497,10 @@ class Board:
         x, y = position
         return 0 <= x < self.size and 0 <= y < self.size
 
-    def get_grid_rect(self, display_manager):
-        current_width, current_height = display_manager.get_dimensions()
-        desired_board_height = current_height * 0.8
-        cell_size = desired_board_height / self.size
-        board_pixels = self.size * cell_size
-
-        grid_rect = pygame.Rect(0, 0, board_pixels, board_pixels)
-        grid_rect.center = (current_width // 2, current_height // 2)
-        return grid_rect, cell_size
-
     def resize_board(self, new_size):
         self.size = new_size
-        self.board = [[None for x in range(new_size)] for y in range(new_size)]
\ No newline at end of file
+        self.board = [[None for x in range(new_size)] for y in range(new_size)]
+        self._reset_storage()
+        if self.move_cache is not None:
+            # Entries are keyed by size, but the old size's ones won't be asked for again
+            self.move_cache.clear()
\ No newline at end of file
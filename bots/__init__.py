@@ -0,0 +1 @@
+"""Computer players built on the headless rules package."""
@@ -0,0 +1,199 @@
+import time
+from bots.evaluation import evaluate, PIECE_VALUES, WIN_SCORE
+from constants import PLAYER_1, PLAYER_2
+from rules.engine import legal_actions, apply, undo
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# How often the clock is read, in nodes
+TIME_CHECK_INTERVAL = 512
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaBot:
+    """Negamax alpha-beta with iterative deepening, a transposition table and a hard time limit"""
+
+    def __init__(self, time_limit=2.0, max_depth=32, table_size=1 << 20, move_cache_size=0, book=None,
+                 tablebase=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.table_size = table_size
+        # Iterative deepening walks the same positions again at every depth. When set, the
+        # searched board gets a MoveCache of this size if it doesn't have one already
+        self.move_cache_size = move_cache_size
+        # OpeningBook consulted before searching, see bots/opening_book.py
+        self.book = book
+        # Tablebase giving exact results once few enough pieces are left, see bots/tablebase.py
+        self.tablebase = tablebase
+        self.table = {}
+        self.deadline = 0.0
+        self.nodes = 0
+        # Filled in by choose_action for whoever wants to report on the search
+        self.stats = {}
+
+    def choose_action(self, state):
+        """Best action for the side to move of state. state is left as it was found."""
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit
+        self.nodes = 0
+        if len(self.table) > self.table_size:
+            self.table.clear()
+        if self.move_cache_size and state.board.move_cache is None:
+            state.board.enable_move_cache(self.move_cache_size)
+
+        if self.book is not None:
+            action = self.book.probe(state)
+            if action is not None:
+                self.stats = {"depth": 0, "nodes": 0, "seconds": time.perf_counter() - start,
+                              "nodes_per_second": 0.0, "score": 0, "book": True}
+                return action
+
+        if self.tablebase is not None:
+            action = self.tablebase.best_action(state)
+            if action is not None:
+                self.stats = {"depth": 0, "nodes": 0, "seconds": time.perf_counter() - start,
+                              "nodes_per_second": 0.0, "score": self._tablebase_score(state, 0),
+                              "tablebase": True}
+                return action
+
+        actions = legal_actions(state)
+        if not actions:
+            return None
+
+        best_action = actions[0]
+        best_score = 0
+        depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, action = self._search_root(state, depth)
+            except SearchTimeout:
+                break
+            best_score, best_action, depth_reached = score, action, depth
+            # No point searching deeper once a forced result is found
+            if abs(score) >= WIN_SCORE - self.max_depth:
+                break
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "depth": depth_reached,
+            "nodes": self.nodes,
+            "seconds": elapsed,
+            "nodes_per_second": self.nodes / max(elapsed, 1e-9),
+            "score": best_score
+        }
+        if state.board.move_cache is not None:
+            self.stats["move_cache"] = state.board.move_cache.stats()
+        return best_action
+
+    def _tablebase_score(self, state, ply):
+        # Same scale as a search result, mates sooner scoring further from zero
+        found = self.tablebase.probe(state)
+        if found is None:
+            return None
+        result, plies = found
+        if result == "win":
+            return WIN_SCORE - ply - plies
+        if result == "loss":
+            return -WIN_SCORE + ply + plies
+        return 0
+
+    def _check_time(self):
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_INTERVAL == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _search_root(self, state, depth):
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_action = None
+        entry = self.table.get(state.key())
+        for action in self._ordered(state, legal_actions(state), entry[3] if entry is not None else None):
+            apply(state, action)
+            try:
+                score = -self._negamax(state, depth - 1, -beta, -alpha, 1)
+            finally:
+                undo(state)
+            if best_action is None or score > alpha:
+                alpha, best_action = score, action
+        self.table[state.key()] = (depth, alpha, EXACT, best_action)
+        return alpha, best_action
+
+    def _negamax(self, state, depth, alpha, beta, ply):
+        self._check_time()
+
+        if state.winner is not None:
+            # The previous mover just took our monarch, prefer the slowest loss
+            return -WIN_SCORE + ply
+
+        if self.tablebase is not None:
+            score = self._tablebase_score(state, ply)
+            if score is not None:
+                return score
+
+        key = state.key()
+        entry = self.table.get(key)
+        if entry is not None and entry[0] >= depth:
+            entry_depth, score, flag, _ = entry
+            if flag == EXACT:
+                return score
+            if flag == LOWER and score >= beta:
+                return score
+            if flag == UPPER and score <= alpha:
+                return score
+
+        if depth == 0:
+            # Our monarch capture is one ply away, score it without searching for it
+            if state.board.is_monarch_attacked(PLAYER_2 if state.current_player == PLAYER_1 else PLAYER_1):
+                return WIN_SCORE - ply - 1
+            return evaluate(state)
+
+        actions = legal_actions(state)
+        if not actions:
+            return 0
+
+        original_alpha = alpha
+        best_score = -WIN_SCORE - 1
+        best_action = None
+        for action in self._ordered(state, actions, entry[3] if entry is not None else None):
+            apply(state, action)
+            try:
+                score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                undo(state)
+            if score > best_score:
+                best_score, best_action = score, action
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (depth, best_score, flag, best_action)
+        return best_score
+
+    def _ordered(self, state, actions, table_action=None):
+        """Table move first, then monarch captures, then other captures by victim value"""
+        board = state.board
+
+        def priority(action):
+            if action == table_action:
+                return -2 * WIN_SCORE
+            if action.origin is None:
+                return 0
+            victim = board.get_piece(action.target)
+            if victim is None:
+                return 0
+            if victim.name == "monarch":
+                return -WIN_SCORE
+            return -PIECE_VALUES[victim.name]
+
+        return sorted(actions, key=priority)
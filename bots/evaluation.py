@@ -0,0 +1,37 @@
+from constants import PLAYER_1, PLAYER_2
+
+WIN_SCORE = 100000
+
+# The monarch is priceless, losing it ends the game
+PIECE_VALUES = {
+    "monarch": 0,
+    "advisor": 50,
+    "official": 30,
+    "palace": 40,
+    "spy": 20
+}
+PROMOTION_BONUS = 10
+
+
+def material(state, player) -> int:
+    """Value of everything a player owns, on the board and in reserve"""
+    board = state.board
+    score = 0
+    for row in board.board:
+        for piece in row:
+            if piece is not None and piece.owner == player:
+                score += PIECE_VALUES[piece.name]
+                if piece.promoted:
+                    score += PROMOTION_BONUS
+    for piece in state.reserve_manager.get_pieces(player):
+        score += PIECE_VALUES[piece.name]
+    return score
+
+
+def evaluate(state) -> int:
+    """Static score from the point of view of the side to move"""
+    player = state.current_player
+    opponent = PLAYER_2 if player == PLAYER_1 else PLAYER_1
+    if state.winner is not None:
+        return WIN_SCORE if state.winner == player else -WIN_SCORE
+    return material(state, player) - material(state, opponent)
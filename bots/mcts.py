@@ -0,0 +1,215 @@
+"""Monte Carlo tree search spread over a process pool.
+
+Every round each worker grows its own UCT tree from the root for a slice of the
+time budget, then the root statistics of all workers are merged. Workers share
+nothing, so throughput scales with the number of cores.
+
+Run from the repository root to measure playouts/second:
+    python -m bots.mcts --size 9 --workers 4 --time 5
+"""
+import argparse
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bots.evaluation import evaluate
+from constants import PLAYER_1, PLAYER_2
+from rules.engine import legal_actions, apply, undo
+from rules.state import GameState
+
+EXPLORATION = 1.4
+# Playouts longer than this are scored by the static evaluation instead
+MAX_PLAYOUT_LENGTH = 60
+ROUND_SECONDS = 0.5
+
+
+class _Node:
+    __slots__ = ("action", "parent", "mover", "children", "untried", "visits", "wins")
+
+    def __init__(self, action, parent, mover, untried):
+        self.action = action
+        self.parent = parent
+        # Player who played action to reach this node
+        self.mover = mover
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self):
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits +
+                   EXPLORATION * math.sqrt(log_visits / child.visits))
+
+
+def _playout(state, rng):
+    """Play lightly guided random moves and return the winner, or None for a draw"""
+    played = 0
+    while state.winner is None and played < MAX_PLAYOUT_LENGTH:
+        actions = legal_actions(state)
+        if not actions:
+            break
+        apply(state, _guided_choice(state, actions, rng))
+        played += 1
+
+    winner = state.winner
+    if winner is None:
+        score = evaluate(state)
+        if score:
+            winner = state.current_player if score > 0 else _opponent(state.current_player)
+
+    for _ in range(played):
+        undo(state)
+    return winner
+
+
+def _guided_choice(state, actions, rng):
+    # Always take the monarch when it's on offer
+    board = state.board
+    if not board.is_monarch_attacked(_opponent(state.current_player)):
+        return rng.choice(actions)
+    for action in actions:
+        if action.origin is not None:
+            target = board.get_piece(action.target)
+            if target is not None and target.name == "monarch":
+                return action
+    return rng.choice(actions)
+
+
+def _opponent(player):
+    return PLAYER_2 if player == PLAYER_1 else PLAYER_1
+
+
+def search_root(state, seconds, seed):
+    """Grow one UCT tree from state for a number of seconds, return its root statistics"""
+    rng = random.Random(seed)
+    root = _Node(None, None, _opponent(state.current_player), legal_actions(state))
+    deadline = time.perf_counter() + seconds
+    playouts = 0
+
+    while time.perf_counter() < deadline:
+        node = root
+        depth = 0
+
+        # Selection
+        while not node.untried and node.children:
+            node = node.select_child()
+            apply(state, node.action)
+            depth += 1
+
+        # Expansion
+        if node.untried:
+            action = node.untried.pop(rng.randrange(len(node.untried)))
+            mover = state.current_player
+            apply(state, action)
+            depth += 1
+            child = _Node(action, node, mover, legal_actions(state))
+            node.children.append(child)
+            node = child
+
+        winner = _playout(state, rng)
+        playouts += 1
+
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.mover:
+                node.wins += 1
+            node = node.parent
+
+        for _ in range(depth):
+            undo(state)
+
+    return {child.action: (child.visits, child.wins) for child in root.children}, playouts
+
+
+class MCTSBot:
+    def __init__(self, time_limit=2.0, workers=None):
+        self.time_limit = time_limit
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.stats = {}
+
+    def choose_action(self, state):
+        actions = legal_actions(state)
+        if not actions:
+            return None
+        if len(actions) == 1:
+            return actions[0]
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        start = time.perf_counter()
+        deadline = start + self.time_limit
+        # Workers get a copy without the undo history
+        root_state = state.copy()
+        totals = {}
+        playouts = 0
+        rounds = 0
+
+        while True:
+            seconds = min(ROUND_SECONDS, deadline - time.perf_counter())
+            if seconds <= 0:
+                break
+            futures = [self.executor.submit(search_root, root_state, seconds,
+                                              rounds * self.workers + worker)
+                       for worker in range(self.workers)]
+            for future in futures:
+                statistics, worker_playouts = future.result()
+                playouts += worker_playouts
+                for action, (visits, wins) in statistics.items():
+                    total_visits, total_wins = totals.get(action, (0, 0.0))
+                    totals[action] = (total_visits + visits, total_wins + wins)
+            rounds += 1
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "playouts": playouts,
+            "rounds": rounds,
+            "workers": self.workers,
+            "seconds": elapsed,
+            "playouts_per_second": playouts / max(elapsed, 1e-9)
+        }
+        if not totals:
+            return actions[0]
+        # Most visited is the most robust choice
+        return max(totals, key=lambda action: totals[action][0])
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure MCTS playout throughput")
+    parser.add_argument("--size", type=int, default=9)
+    parser.add_argument("--time", type=float, default=5.0, help="seconds to search")
+    parser.add_argument("--workers", type=int, nargs="*", help="worker counts to compare, default all cores")
+    parser.add_argument("--opening-moves", type=int, default=8, help="random moves played before searching")
+    args = parser.parse_args(argv)
+
+    state = GameState(args.size)
+    rng = random.Random(0)
+    for _ in range(args.opening_moves):
+        actions = legal_actions(state)
+        if not actions:
+            break
+        apply(state, rng.choice(actions))
+
+    for workers in args.workers or [os.cpu_count() or 1]:
+        bot = MCTSBot(time_limit=args.time, workers=workers)
+        try:
+            action = bot.choose_action(state)
+        finally:
+            bot.close()
+        stats = bot.stats
+        print(f"workers={workers:<3} playouts={stats['playouts']:<8} "
+              f"playouts/s={stats['playouts_per_second']:.0f}  best={action}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Opening books: the best-scoring action of positions seen early in recorded games.
+
+A book is a header followed by fixed-width entries sorted by position key:
+
+    header   magic "SJB", version, board size, starting reserve of advisors,
+             officials, palaces and spies, entry count (I)
+    entry    position key (Q), action code (B), origin (H), target (H),
+             score (f), games (I), little-endian
+
+Actions are encoded as in records/format.py and the key is GameState.key(). Books
+are read through a read-only memory map and searched with a binary search, so
+opening one costs nothing and every process using the same file shares its pages.
+
+Build one from game records, e.g. self-play written by the tournament runner:
+    python -m bots.tournament --games 2000 --size 9 --records SelfPlay
+    python -m bots.opening_book SelfPlay GameRecords --size 9 --output OpeningBooks/9x9.sjb
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from constants import BOARD_SIZE, OPENING_BOOKS_DIR, PIECE_COUNTS, PIECE_FLAGS
+from records.analytics import iter_record_paths, parse
+from records.format import COUNTED_PIECES, RecordError, action_fields, decode_action
+from records.replay import Replay
+from rules.engine import legal_actions, apply
+from rules.state import GameState
+
+MAGIC = b"SJB"
+VERSION = 1
+HEADER = struct.Struct("<3sBB4BI")
+ENTRY = struct.Struct("<QBHHfI")
+KEY = struct.Struct("<Q")
+
+DEFAULT_MAX_PLY = 12
+DEFAULT_MIN_GAMES = 2
+
+
+class OpeningBook:
+    """Read-only view of a book file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as book_file:
+            self._map = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is too short to be an opening book")
+        magic, version, self.size, *counts, self.entries = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} isn't a version {VERSION} opening book")
+        if len(self._map) < HEADER.size + self.entries * ENTRY.size:
+            raise ValueError(f"{path} is truncated")
+        self.piece_counts = dict(zip(COUNTED_PIECES, counts))
+
+    def __len__(self):
+        return self.entries
+
+    def lookup(self, key):
+        """(Move, score, games) stored for a position key, or None"""
+        book = self._map
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = KEY.unpack_from(book, HEADER.size + middle * ENTRY.size)[0]
+            if middle_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.entries:
+            return None
+        entry_key, code, origin, target, score, games = ENTRY.unpack_from(book, HEADER.size + low * ENTRY.size)
+        if entry_key != key:
+            return None
+        action, _ = decode_action(code, origin, target, self.size)
+        return action, score, games
+
+    def probe(self, state):
+        """The book action for the side to move of state, or None if the book has nothing for it"""
+        if state.size != self.size or state.reserve_manager.piece_counts != self.piece_counts:
+            return None
+        found = self.lookup(state.key())
+        if found is None:
+            return None
+        # Guards against the rare key collision
+        action = found[0]
+        return action if action in legal_actions(state) else None
+
+    def close(self):
+        self._map.close()
+
+
+def book_path(size, directory=OPENING_BOOKS_DIR):
+    return os.path.join(directory, f"{size}x{size}.sjb")
+
+
+def load_book_for(size, directory=OPENING_BOOKS_DIR):
+    """The book for a board size if one has been built, otherwise None"""
+    path = book_path(size, directory)
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def collect(records, size, piece_counts, max_ply=DEFAULT_MAX_PLY):
+    """{key: {action: [score total, games]}} over the first max_ply actions of matching records.
+
+    An action scores 1 for the player who went on to win, 0 for the loser and 0.5 when
+    the game wasn't decided.
+    """
+    stats = {}
+    for record in records:
+        if isinstance(record, Exception) or record.size != size or record.piece_counts != piece_counts:
+            continue
+        # Check the whole record and find out who won before trusting its actions
+        replay = Replay(record)
+        try:
+            replay.seek(len(record))
+        except RecordError:
+            continue
+
+        state = GameState(size, piece_counts)
+        played = []
+        for action in record.actions[:max_ply]:
+            played.append((state.key(), state.current_player, action))
+            apply(state, action)
+
+        for key, player, action in played:
+            if replay.winner is None:
+                score = 0.5
+            else:
+                score = 1.0 if replay.winner == player else 0.0
+            action_stats = stats.setdefault(key, {}).setdefault(action, [0.0, 0])
+            action_stats[0] += score
+            action_stats[1] += 1
+    return stats
+
+
+def write_book(path, stats, size, piece_counts, min_games=DEFAULT_MIN_GAMES):
+    """Keep the best-scoring action of each position played at least min_games times"""
+    entries = []
+    for key, actions in stats.items():
+        candidates = [(total / games, games, action) for action, (total, games) in actions.items()
+                      if games >= min_games]
+        if candidates:
+            score, games, action = max(candidates, key=lambda candidate: candidate[:2])
+            entries.append((key, action, score, games))
+    entries.sort(key=lambda entry: entry[0])
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Written next to the old book and swapped in, so readers never map a half-written file
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, VERSION, size,
+                                    *(piece_counts.get(name, 0) for name in COUNTED_PIECES), len(entries)))
+        for key, action, score, games in entries:
+            book_file.write(ENTRY.pack(key, *action_fields(action, size), score, games))
+    os.replace(temporary_path, path)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an opening book from directories of game records")
+    parser.add_argument("roots", nargs="+", help="directories searched for .sjr files")
+    parser.add_argument("--size", type=int, default=BOARD_SIZE)
+    parser.add_argument("--max-ply", type=int, default=DEFAULT_MAX_PLY, help="actions per game that go in the book")
+    parser.add_argument("--min-games", type=int, default=DEFAULT_MIN_GAMES,
+                        help="times an action must have been played to be kept")
+    parser.add_argument("--output", help=f"book file, {OPENING_BOOKS_DIR}/<size>x<size>.sjb by default")
+    for name in COUNTED_PIECES:
+        parser.add_argument(PIECE_FLAGS[name], type=int, default=PIECE_COUNTS[name], dest=name,
+                            help=f"{name} pieces in each starting reserve of the games to use")
+    args = parser.parse_args(argv)
+
+    piece_counts = {name: getattr(args, name) for name in COUNTED_PIECES}
+    records = parse(path for root in args.roots for path in iter_record_paths(root))
+    stats = collect(records, args.size, piece_counts, args.max_ply)
+    output = args.output or book_path(args.size)
+    entries = write_book(output, stats, args.size, piece_counts, args.min_games)
+    print(f"Wrote {entries} positions out of {len(stats)} seen to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
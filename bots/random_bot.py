@@ -0,0 +1,16 @@
+import random
+from rules.engine import legal_actions
+
+
+class RandomBot:
+    """Plays a uniformly random legal action, the baseline for tournaments"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.stats = {}
+
+    def choose_action(self, state):
+        actions = legal_actions(state)
+        if not actions:
+            return None
+        return self.rng.choice(actions)
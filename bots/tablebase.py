@@ -0,0 +1,326 @@
+"""Endgame tablebases: exact results for small boards with only a few pieces left.
+
+A table covers every position on one board size with both monarchs on the board
+and a fixed set of other pieces, each of which may be on any square or in either
+reserve. Captures only move pieces between the board and the reserves, so the set
+never changes until a monarch falls and every position the game can reach from a
+covered one is covered too.
+
+Positions are numbered in mixed radix: side to move, each monarch's square and
+promotion, then the location of every other piece (owner and square, or owner's
+reserve). Pieces of the same type are interchangeable, so only positions with
+their locations in ascending order are used. A position's result is one byte:
+
+    0          draw, or not a reachable position
+    1..127     the side to move wins in that many plies
+    129..255   the side to move loses in (value - 128) plies
+
+A side with no legal action is treated as drawn, as the search does.
+
+Build one, e.g.:
+    python -m bots.tablebase --size 4 --pieces official advisor
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from constants import PLAYER_1, PLAYER_2
+from piece import Piece, movement_for
+from records.format import PIECE_CODES
+from rules.engine import legal_actions, apply, undo
+from rules.state import GameState
+from zobrist import PIECE_NAMES
+
+MAGIC = b"SJT"
+VERSION = 1
+# magic, version, board size, number of other pieces, then one piece code each
+HEADER = struct.Struct("<3sBBB")
+TABLEBASES_DIR = "Tablebases"
+
+DRAW = 0
+LOSS = 128
+MAX_DISTANCE = 127
+
+
+class TablebaseLayout:
+    """Numbering of the positions of one board size and set of pieces"""
+
+    def __init__(self, size, pieces):
+        self.size = size
+        # Grouped by type so interchangeable pieces sit next to each other
+        self.pieces = tuple(sorted(pieces, key=PIECE_NAMES.index))
+        if "monarch" in self.pieces:
+            raise ValueError("Both monarchs are always part of a table, list only the other pieces")
+        squares = size * size
+        self.squares = squares
+        # Locations of a non-monarch piece: squares of player 1, squares of player 2,
+        # then player 1's and player 2's reserve
+        self.locations = 2 * squares + 2
+        self.positions = 2 * (2 * squares) ** 2 * self.locations ** len(self.pieces)
+        self.counts = {name: self.pieces.count(name) for name in set(self.pieces)}
+
+    def _location(self, owner, square):
+        base = 0 if owner == PLAYER_1 else self.squares
+        if square is None:
+            return 2 * self.squares + (0 if owner == PLAYER_1 else 1)
+        return base + square
+
+    def index_of(self, state):
+        """Position number of state, or None if it isn't covered by this layout"""
+        if state.size != self.size or state.game_phase != "playing" or state.winner is not None:
+            return None
+        board = state.board
+        size = self.size
+        monarchs = {}
+        locations = {name: [] for name in self.counts}
+        for owner in (PLAYER_1, PLAYER_2):
+            mask = board.get_owner_mask(owner)
+            while mask:
+                low = mask & -mask
+                square = low.bit_length() - 1
+                mask ^= low
+                piece = board.board[square // size][square % size]
+                if piece.name == "monarch":
+                    monarchs[owner] = square * 2 + piece.promoted
+                elif piece.name in locations:
+                    locations[piece.name].append(self._location(owner, square))
+                else:
+                    return None
+            for piece in state.reserve_manager.get_pieces(owner):
+                if piece.name not in locations:
+                    return None
+                locations[piece.name].append(self._location(owner, None))
+        if len(monarchs) != 2:
+            return None
+
+        index = 0 if state.current_player == PLAYER_1 else 1
+        index = index * 2 * self.squares + monarchs[PLAYER_1]
+        index = index * 2 * self.squares + monarchs[PLAYER_2]
+        for name in sorted(self.counts, key=PIECE_NAMES.index):
+            found = locations[name]
+            if len(found) != self.counts[name]:
+                return None
+            for location in sorted(found):
+                index = index * self.locations + location
+        return index
+
+    def decode(self, index):
+        """The digits of a position number, or None for one with its pieces out of order"""
+        piece_locations = []
+        for _ in self.pieces:
+            index, location = divmod(index, self.locations)
+            piece_locations.append(location)
+        piece_locations.reverse()
+        for previous, (name, location) in enumerate(zip(self.pieces[1:], piece_locations[1:])):
+            if name == self.pieces[previous] and location < piece_locations[previous]:
+                return None
+        index, monarch_2 = divmod(index, 2 * self.squares)
+        player, monarch_1 = divmod(index, 2 * self.squares)
+        return (PLAYER_1 if player == 0 else PLAYER_2), monarch_1, monarch_2, piece_locations
+
+    def state_at(self, index):
+        """GameState for a position number, or None if no game can be in that position"""
+        decoded = self.decode(index)
+        if decoded is None:
+            return None
+        player, monarch_1, monarch_2, piece_locations = decoded
+        size = self.size
+        grid = [[None] * size for _ in range(size)]
+        reserves = {PLAYER_1: [], PLAYER_2: []}
+
+        for owner, digit in ((PLAYER_1, monarch_1), (PLAYER_2, monarch_2)):
+            square, promoted = divmod(digit, 2)
+            if grid[square // size][square % size] is not None:
+                return None
+            context = "promoted" if promoted else None
+            grid[square // size][square % size] = Piece("monarch", movement_for("monarch", context), owner, bool(promoted))
+
+        for name, location in zip(self.pieces, piece_locations):
+            if location >= 2 * self.squares:
+                owner = PLAYER_1 if location == 2 * self.squares else PLAYER_2
+                reserves[owner].append(Piece(name, movement_for(name), owner))
+                continue
+            owner = PLAYER_1 if location < self.squares else PLAYER_2
+            square = location % self.squares
+            if grid[square // size][square % size] is not None:
+                return None
+            grid[square // size][square % size] = Piece(name, movement_for(name), owner)
+
+        state = GameState(size, {name: 0 for name in ("advisor", "official", "palace", "spy")})
+        state.board.load_grid(grid)
+        state.reserve_manager.load_reserves(reserves)
+        state.board.check_all_pieces_status()
+        state.current_player = player
+        state.game_phase = "playing"
+        state.monarchs_placed = {PLAYER_1: True, PLAYER_2: True}
+        # A monarch's promotion has to be what its neighbours would have settled it to
+        if self.index_of(state) != index:
+            return None
+        return state
+
+
+def generate(size, pieces, progress=None):
+    """bytearray of results for every position of the layout, by retrograde iteration"""
+    layout = TablebaseLayout(size, pieces)
+    # Successor numbers of each position, and the positions where a monarch can be taken at once
+    starts = array("q", [0])
+    successors = array("q")
+    wins_at_once = set()
+    reachable = []
+
+    for index in range(layout.positions):
+        state = layout.state_at(index)
+        if state is not None:
+            reachable.append(index)
+            for action in legal_actions(state):
+                apply(state, action)
+                if state.winner is not None:
+                    wins_at_once.add(index)
+                else:
+                    # Captures only move pieces into a reserve, so the layout covers every successor
+                    successors.append(layout.index_of(state))
+                undo(state)
+        starts.append(len(successors))
+        if progress and index % 100000 == 0:
+            progress(f"{index}/{layout.positions} positions expanded")
+
+    results = bytearray(layout.positions)
+    for index in wins_at_once:
+        results[index] = 1
+
+    # Ply by ply: a win in d has a successor lost in d - 1, a loss in d has only
+    # successors that are wins, the slowest of them in d - 1
+    unknown = [index for index in reachable if index not in wins_at_once and starts[index] != starts[index + 1]]
+    distance = 1
+    idle = 0
+    while unknown:
+        distance += 1
+        if distance > MAX_DISTANCE:
+            raise ValueError("Results are too far away to store in a byte")
+        decided = {}
+        still_unknown = []
+        for index in unknown:
+            values = [results[successor] for successor in successors[starts[index]:starts[index + 1]]]
+            if distance % 2:
+                if LOSS + distance - 1 in values:
+                    decided[index] = distance
+            elif all(0 < value < LOSS for value in values):
+                decided[index] = LOSS + distance
+            if index not in decided:
+                still_unknown.append(index)
+        # Applied after the pass so every result found in it has the same distance
+        for index, value in decided.items():
+            results[index] = value
+        # Nothing new in a win pass and the loss pass after it means nothing new ever
+        idle = 0 if decided else idle + 1
+        if idle == 2:
+            break
+        unknown = still_unknown
+        if progress:
+            progress(f"distance {distance}: {len(decided)} positions decided, {len(unknown)} left")
+    return layout, results
+
+
+def write_tablebase(path, layout, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as table_file:
+        table_file.write(HEADER.pack(MAGIC, VERSION, layout.size, len(layout.pieces)))
+        table_file.write(bytes(PIECE_CODES[name] for name in layout.pieces))
+        table_file.write(results)
+    os.replace(temporary_path, path)
+
+
+class Tablebase:
+    """Read-only, memory-mapped view of a tablebase file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as table_file:
+            self._map = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, piece_count = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} isn't a version {VERSION} tablebase")
+        pieces = [PIECE_NAMES[code] for code in self._map[HEADER.size:HEADER.size + piece_count]]
+        self.layout = TablebaseLayout(size, pieces)
+        self._offset = HEADER.size + piece_count
+        if len(self._map) != self._offset + self.layout.positions:
+            raise ValueError(f"{path} doesn't hold one result per position")
+
+    @property
+    def size(self):
+        return self.layout.size
+
+    def probe(self, state):
+        """("win" | "loss" | "draw", plies) for the side to move, or None if state isn't covered"""
+        index = self.layout.index_of(state)
+        if index is None:
+            return None
+        value = self._map[self._offset + index]
+        if value == DRAW:
+            return "draw", 0
+        if value < LOSS:
+            return "win", value
+        return "loss", value - LOSS
+
+    def best_action(self, state):
+        """The fastest win, slowest loss or a drawing action, or None if state isn't covered"""
+        if self.probe(state) is None:
+            return None
+        best, best_rank = None, None
+        for action in legal_actions(state):
+            apply(state, action)
+            try:
+                if state.winner is not None:
+                    return action
+                result, plies = self.probe(state)
+            finally:
+                undo(state)
+            # Ranked from the mover's side: opponent's loss, then draw, then opponent's win
+            if result == "loss":
+                rank = (2, -plies)
+            elif result == "draw":
+                rank = (1, 0)
+            else:
+                rank = (0, plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = action, rank
+        return best
+
+    def close(self):
+        self._map.close()
+
+
+def tablebase_path(size, pieces, directory=TABLEBASES_DIR):
+    names = "_".join(sorted(pieces, key=PIECE_NAMES.index)) or "monarchs"
+    return os.path.join(directory, f"{size}x{size}_{names}.sjt")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate an endgame tablebase")
+    parser.add_argument("--size", type=int, default=4)
+    parser.add_argument("--pieces", nargs="*", default=["official"], choices=PIECE_NAMES[1:],
+                        help="pieces besides the two monarchs, repeat a name for several")
+    parser.add_argument("--output", help=f"{TABLEBASES_DIR}/<size>x<size>_<pieces>.sjt by default")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    layout, results = generate(args.size, args.pieces, progress=print)
+    output = args.output or tablebase_path(args.size, args.pieces)
+    write_tablebase(output, layout, results)
+
+    wins = [value for value in results if 0 < value < LOSS]
+    losses = [value - LOSS for value in results if value > LOSS]
+    print(f"{layout.positions} positions, {len(wins)} wins (longest {max(wins, default=0)} plies), "
+          f"{len(losses)} losses (longest {max(losses, default=0)} plies) "
+          f"in {time.perf_counter() - start:.1f}s, written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Headless bot-vs-bot tournaments for balancing board sizes and piece counts.
+
+Games run in worker processes and each result is appended to a JSON lines file
+as soon as it finishes. Nothing here touches pygame.
+
+Run from the repository root, for example:
+    python -m bots.tournament --games 1000 --size 7 --officials 4 --output results.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from bots.alphabeta import AlphaBetaBot
+from bots.random_bot import RandomBot
+from records.format import GameRecord
+from constants import PLAYER_1, PLAYER_2, PIECE_COUNTS, PIECE_FLAGS, MIN_BOARD_SIZE, MAX_BOARD_SIZE
+from rules.engine import legal_actions, apply
+from rules.state import GameState
+from zobrist import MAX_RESERVE_COUNT
+
+BOTS = ("alphabeta", "random")
+
+
+# Opening books and tablebases opened by this process, shared by all of its games
+_OPENED = {}
+
+
+def _open_shared(opener, path):
+    if path is None:
+        return None
+    opened = _OPENED.get(path)
+    if opened is None:
+        opened = _OPENED[path] = opener(path)
+    return opened
+
+
+def make_bot(name, seed, move_time, depth, book_path=None, tablebase_path=None):
+    if name == "alphabeta":
+        from bots.opening_book import OpeningBook
+        from bots.tablebase import Tablebase
+        return AlphaBetaBot(time_limit=move_time, max_depth=depth, book=_open_shared(OpeningBook, book_path),
+                            tablebase=_open_shared(Tablebase, tablebase_path))
+    if name == "random":
+        return RandomBot(seed)
+    raise ValueError(f"Unknown bot: {name}")
+
+
+def play_game(game_index, config):
+    """Play one game to the end and describe how it went"""
+    start = time.perf_counter()
+    rng = random.Random(config["seed"] + game_index)
+    state = GameState(config["size"], config["piece_counts"])
+    bots = {
+        PLAYER_1: make_bot(config["player1"], rng.random(), config["move_time"], config["depth"],
+                           config["book"], config["tablebase"]),
+        PLAYER_2: make_bot(config["player2"], rng.random(), config["move_time"], config["depth"],
+                           config["book"], config["tablebase"])
+    }
+    record = GameRecord(config["size"], config["piece_counts"])
+
+    moves = 0
+    while state.winner is None and moves < config["max_moves"]:
+        # A few random moves first so deterministic bots don't replay the same game
+        if moves < config["random_openings"]:
+            actions = legal_actions(state)
+            action = rng.choice(actions) if actions else None
+        else:
+            action = bots[state.current_player].choose_action(state)
+        if action is None:
+            break
+        record.append(action, not action.is_drop and state.board.get_piece(action.target) is not None)
+        apply(state, action)
+        moves += 1
+
+    if config["records"]:
+        record.save(os.path.join(config["records"], f"game_{config['seed']}_{game_index}.sjr"))
+
+    return {
+        "game": game_index,
+        "size": config["size"],
+        "player1": config["player1"],
+        "player2": config["player2"],
+        "piece_counts": config["piece_counts"],
+        "winner": state.winner,
+        "moves": moves,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def wilson_interval(wins, games, z=1.96):
+    """95% confidence interval for a win rate"""
+    if games == 0:
+        return 0.0, 0.0
+    rate = wins / games
+    denominator = 1 + z * z / games
+    center = (rate + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def summarize(results, elapsed):
+    games = len(results)
+    if not games:
+        return "No games played"
+    lines = [f"{games} games in {elapsed:.1f}s, {games / max(elapsed, 1e-9):.2f} games/s, "
+             f"average length {sum(r['moves'] for r in results) / games:.1f} moves"]
+    for label, winner in (("player 1", PLAYER_1), ("player 2", PLAYER_2), ("draws", None)):
+        count = sum(1 for r in results if r["winner"] == winner)
+        low, high = wilson_interval(count, games)
+        lines.append(f"  {label:<9} {count:>6}  {count / games:6.1%}  (95% CI {low:.1%} - {high:.1%})")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play bot-vs-bot Seiji games in parallel")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--size", type=int, default=9)
+    parser.add_argument("--player1", choices=BOTS, default="alphabeta")
+    parser.add_argument("--player2", choices=BOTS, default="alphabeta")
+    parser.add_argument("--move-time", type=float, default=0.1, help="seconds per alpha-beta move")
+    parser.add_argument("--depth", type=int, default=2, help="maximum alpha-beta depth")
+    parser.add_argument("--max-moves", type=int, default=300, help="moves before a game is called a draw")
+    parser.add_argument("--random-openings", type=int, default=4, help="random moves at the start of each game")
+    for name, flag in PIECE_FLAGS.items():
+        parser.add_argument(flag, type=int, default=PIECE_COUNTS[name], dest=name,
+                            help=f"{name} pieces in each starting reserve")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="tournament_results.jsonl")
+    parser.add_argument("--records", help="also save every game as a record in this directory")
+    parser.add_argument("--book", help="opening book for the alpha-beta players")
+    parser.add_argument("--tablebase", help="endgame tablebase for the alpha-beta players")
+    args = parser.parse_args(argv)
+    if not MIN_BOARD_SIZE <= args.size <= MAX_BOARD_SIZE:
+        parser.error(f"--size must be between {MIN_BOARD_SIZE} and {MAX_BOARD_SIZE}")
+    for name, flag in PIECE_FLAGS.items():
+        # Captures can put both players' pieces of a type in one reserve
+        if not 0 <= 2 * getattr(args, name) <= MAX_RESERVE_COUNT:
+            parser.error(f"{flag} must be between 0 and {MAX_RESERVE_COUNT // 2}")
+
+    config = {
+        "size": args.size,
+        "player1": args.player1,
+        "player2": args.player2,
+        "move_time": args.move_time,
+        "depth": args.depth,
+        "max_moves": args.max_moves,
+        "random_openings": args.random_openings,
+        "piece_counts": {name: getattr(args, name) for name in PIECE_COUNTS},
+        "seed": args.seed,
+        "records": args.records,
+        "book": args.book,
+        "tablebase": args.tablebase
+    }
+    if args.records:
+        os.makedirs(args.records, exist_ok=True)
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, open(args.output, "a") as output:
+        futures = [executor.submit(play_game, game_index, config) for game_index in range(args.games)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            if len(results) % 100 == 0:
+                print(f"{len(results)}/{args.games} games, {len(results) / (time.perf_counter() - start):.2f} games/s")
+
+    print(summarize(results, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
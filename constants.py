@@ -5,8 +5,19 @@
 BASE_WINDOW_WIDTH = 1920    
 BASE_WINDOW_HEIGHT = 1080
 BOARD_SIZE = 9
+MIN_BOARD_SIZE = 4
+MAX_BOARD_SIZE = 19
 FPS = 60
 
+# Seconds the computer opponent may think per move
+AI_TIME_LIMIT = 2.0
+
+# Finished and in-progress games are written here, one record file per game
+RECORDS_DIR = "GameRecords"
+
+# Opening books for the computer opponent, one file per board size, see bots/opening_book.py
+OPENING_BOOKS_DIR = "OpeningBooks"
+
 # These will now be calculated based on the base dimensions
 BASE_CELL_SIZE = int(BASE_WINDOW_HEIGHT * 0.08)
 BOARD_PIXELS = BOARD_SIZE * BASE_CELL_SIZE
@@ -28,6 +39,17 @@ SPY_NUMBER = 1
 
 NUMBER_OF_PIECES = ADVISOR_NUMBER + OFFICIAL_NUMBER + PALACE_NUMBER
 
+# Starting reserve of each player by piece type, there is always exactly one monarch
+PIECE_COUNTS = {
+    "advisor": ADVISOR_NUMBER,
+    "official": OFFICIAL_NUMBER,
+    "palace": PALACE_NUMBER,
+    "spy": SPY_NUMBER
+}
+
+# Command-line flag that sets each starting reserve count, for the tools that take them
+PIECE_FLAGS = {"advisor": "--advisors", "official": "--officials", "palace": "--palaces", "spy": "--spies"}
+
 # Colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -74,4 +74,32 @@ class DisplayManager:
 
     def get_dimensions(self):
         """Get current screen dimensions"""
-        return self.screen.get_size()
\ No newline at end of file
+        return self.screen.get_size()
+
+    def get_grid_rect(self, board_size):
+        """Get the screen rect of the board and the size of one cell"""
+        current_width, current_height = self.get_dimensions()
+        desired_board_height = current_height * 0.8
+        cell_size = desired_board_height / board_size
+        board_pixels = board_size * cell_size
+
+        grid_rect = pygame.Rect(0, 0, board_pixels, board_pixels)
+        grid_rect.center = (current_width // 2, current_height // 2)
+        return grid_rect, cell_size
+
+    def get_board_position(self, mouse_pos, board_size):
+        """Convert a screen position to board coordinates, None if it's off the board"""
+        grid_rect, cell_size = self.get_grid_rect(board_size)
+
+        # If click is outside board, return None
+        if not grid_rect.collidepoint(mouse_pos):
+            return None
+
+        # Calculate board coordinates
+        board_x = int((mouse_pos[0] - grid_rect.left) / cell_size)
+        board_y = int((mouse_pos[1] - grid_rect.top) / cell_size)
+
+        # Ensure coordinates are within bounds
+        if 0 <= board_x < board_size and 0 <= board_y < board_size:
+            return board_x, board_y
+        return None
\ No newline at end of file
@@ -252,6 +252,9 @@ class MenuDrawUtilities:
         input_text = self.input_font.render(self.menu.ip_input, True, (255, 255, 255))
         screen.blit(input_text, (input_box.x + 5, input_box.y + 10))
 
+        hint = self.input_font.render("ip or ip/ROOM", True, (150, 150, 150))
+        screen.blit(hint, (input_box.x, input_box.bottom + 15))
+
     def _draw_settings(self, screen):
         current_width, current_height = self.display_manager.get_dimensions()
 
@@ -349,7 +352,7 @@ class GameDrawUtilities:
                                                      self.board.size * BASE_CELL_SIZE))
         self.table_texture = pygame.image.load("Textures/tables.png").convert_alpha()
 
-    def draw(self, screen, valid_placements, valid_moves=None, game_phase="playing"):
+    def draw(self, screen, valid_placements, valid_moves=None, game_phase="playing", danger_squares=None):
 
         self.starfield.update()
         self.starfield.draw(screen)
@@ -367,6 +370,9 @@ class GameDrawUtilities:
         if valid_placements:
             self.draw_move_highlights(screen, valid_placements)
 
+        if danger_squares:
+            self.draw_danger_highlights(screen, danger_squares)
+
         self.draw_board_pieces(screen)
 
     def draw_game_over_screen(self, screen, current_player):
@@ -522,6 +528,24 @@ class GameDrawUtilities:
 
             screen.blit(highlight, (screen_x, screen_y))
 
+    def draw_danger_highlights(self, screen, squares):
+        """Outline squares whose piece the opponent could capture"""
+        current_width, current_height = self.display_manager.get_dimensions()
+        desired_board_height = current_height * 0.8
+        cell_size = desired_board_height / self.board.size
+        board_pixels = self.board.size * cell_size
+        grid_rect = pygame.Rect(0, 0, board_pixels, board_pixels)
+        grid_rect.center = (current_width // 2, current_height // 2)
+
+        for x, y in squares:
+            screen_x = grid_rect.left + x * cell_size
+            screen_y = grid_rect.top + y * cell_size
+
+            highlight = pygame.Surface((cell_size, cell_size), pygame.SRCALPHA)
+            pygame.draw.rect(highlight, (255, 140, 0, 90), highlight.get_rect())  # Orange for threatened
+            pygame.draw.rect(highlight, (255, 140, 0, 200), highlight.get_rect(), max(2, int(cell_size * 0.06)))
+            screen.blit(highlight, (screen_x, screen_y))
+
     def draw_board(self, screen):
         current_width, current_height = self.display_manager.get_dimensions()
         desired_board_height = current_height * 0.8
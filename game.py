@@ -8,8 +8,15 @@ from game_ui import GameUI
 from pygame import mixer
 from board import Board
 from constants import *
+from zobrist import position_key
 from menu import Menu
+from rules import GameState
+from records import RecordWriter
+from bots.alphabeta import AlphaBetaBot
+from bots.opening_book import load_book_for
+import threading
 import pygame
+import queue
 import sys
 
 
@@ -27,6 +34,9 @@ class Game:
         self.network_manager = NetworkManager(self)
 
         self.board = Board(BOARD_SIZE, self)
+        self.board.on_promote = lambda: SoundManager.play_sound('promote')
+        # Clicking back and forth between pieces asks for the same moves over and over
+        self.board.enable_move_cache()
         self.display = DisplayManager(BASE_WINDOW_WIDTH, BASE_WINDOW_HEIGHT, False)
         self.menu = Menu(self, self.display)
         self.game_drawer = GameDrawUtilities(self.display, self.board)
@@ -56,11 +66,23 @@ class Game:
         # Dictionaries
         self.monarchs_placed = {PLAYER_1: False, PLAYER_2: False}
 
+        # Computer opponent, searching on its own thread so the frame loop keeps running
+        self.ai_player = None
+        self.ai = AlphaBetaBot(time_limit=AI_TIME_LIMIT)
+        self.ai_thread = None
+        self.ai_results = queue.Queue()
+        self.ai_search_id = 0
+
+        # Record of the game being played, opened on its first action
+        self.record_writer = None
+
         # Booleans
         self.is_multiplayer = False
         self.display_end_game_screen = False
         self.reserved_piece_selected = False
         self.board_interaction = False
+        # Outline pieces the opponent could capture, toggled with D
+        self.show_danger = False
 
     def handle_input_click(self, pos):
 
@@ -75,7 +97,11 @@ class Game:
             self.winner = PLAYER_2 if self.current_player == PLAYER_1 else PLAYER_1
             return
 
-        board_pos = self.board.get_board_position(pos, self.display)
+        # Nothing to click while the computer is thinking
+        if self.current_player == self.ai_player:
+            return
+
+        board_pos = self.display.get_board_position(pos, self.board.size)
 
         player1_reserve_pos = self.reserve_manager.is_click_in_reserve(PLAYER_1, pos, self.display)
         player2_reserve_pos = self.reserve_manager.is_click_in_reserve(PLAYER_2, pos, self.display)
@@ -110,6 +136,8 @@ class Game:
         elif ui_action == "rematch":
             self.current_state = "game"
             self.reset()
+            if self.is_multiplayer:
+                self.network_manager.send_new_game()
             SoundManager.play_sound('rematch')
             SoundManager.handle_music_transition('Sounds/ambient_track.mp3')
 
@@ -126,6 +154,9 @@ class Game:
             self.reserved_piece_selected
         )
 
+        self._handle_action_result(result)
+
+    def _handle_action_result(self, result, send=True):
         self.selected_piece = result['new_selected_piece']
         self.valid_moves = result['new_valid_moves']
         self.valid_placement_squares = result['new_valid_placement_squares']
@@ -137,6 +168,9 @@ class Game:
             if result['log_message']:
                 self.game_ui.add_to_log(result['log_message'])
 
+            if result['played_action'] is not None:
+                self.record_action(result['played_action'], result['captured'])
+
             self.current_player = result['new_player']
             self.monarchs_placed = result['new_monarchs_placed']
             self.game_phase = result['new_game_phase']
@@ -145,11 +179,16 @@ class Game:
 
             if result['game_ended']:
                 self.winner = result['winner']
+                self.close_record()
                 self.current_state = "post_game"
                 SoundManager.handle_music_transition('Sounds/victory_theme.mp3')
 
-            if result['turn_changed'] or result['action_taken']:
-                self.finish_and_send_game_state()
+            if send and result['played_action'] is not None:
+                self.send_action(result['played_action'])
+
+    def apply_network_action(self, action):
+        """Play the opponent's action as it arrived from the server"""
+        self._handle_action_result(self.game_action_handler.apply_action(action, self.current_player), send=False)
 
     def handle_reserve_click(self, pos):
 
@@ -179,6 +218,53 @@ class Game:
         if result['sound_to_play']:
             SoundManager.play_sound(result['sound_to_play'])
 
+    def update_ai(self):
+        """Start a search when it's the computer's turn and play its move once one arrives"""
+        if self.ai_player is None or self.current_player != self.ai_player:
+            return
+
+        if self.ai_thread is None:
+            if self.ai.book is None or self.ai.book.size != self.board.size:
+                self.ai.book = load_book_for(self.board.size)
+            state = GameState.from_game(self)
+            self.ai_thread = threading.Thread(target=self._run_ai, args=(state, self.ai_search_id), daemon=True)
+            self.ai_thread.start()
+            return
+
+        try:
+            search_id, action, stats = self.ai_results.get_nowait()
+        except queue.Empty:
+            return
+        self.ai_thread = None
+        if search_id != self.ai_search_id or action is None:
+            return
+
+        self.game_ui.add_to_log(f"AI: depth {stats['depth']}, {stats['nodes_per_second']:.0f} nodes/s")
+        self._handle_action_result(self.game_action_handler.apply_action(action, self.current_player))
+
+    def _run_ai(self, state, search_id):
+        action = self.ai.choose_action(state)
+        self.ai_results.put((search_id, action, self.ai.stats))
+
+    def record_action(self, action, captured):
+        # A network game that was caught up from a snapshot is missing its start
+        if self.is_multiplayer and not self.network_manager.has_every_action:
+            return
+        try:
+            if self.record_writer is None:
+                self.record_writer = RecordWriter.create(self.board.size, self.reserve_manager.piece_counts)
+            self.record_writer.record(action, captured)
+        except OSError as e:
+            print(f"Couldn't write the game record: {e}")
+
+    def close_record(self):
+        if self.record_writer is not None:
+            self.record_writer.close()
+            self.record_writer = None
+
+    def get_position_key(self):
+        return position_key(self.board, self.reserve_manager, self.current_player, self.game_phase)
+
     def deselect_all(self):
         self.selected_piece = None
         self.valid_moves = []
@@ -187,10 +273,10 @@ class Game:
         self.reserved_piece_selected = False
         SoundManager.play_sound('de_select')
 
-    def finish_and_send_game_state(self):
+    def send_action(self, action):
         if self.is_multiplayer:
-            self.board.check_all_pieces_status()
-            self.network_manager.send_game_state()
+            # Board.make_move has already settled promotions for this turn
+            self.network_manager.send_action(action)
 
     def reset(self):
         self.monarchs_placed = {PLAYER_1: False, PLAYER_2: False}
@@ -210,6 +296,10 @@ class Game:
         self.valid_moves = []
         self.valid_placement_squares = []
 
+        # Drop the result of any search still running for the old game
+        self.ai_search_id += 1
+        self.close_record()
+
     def handle_states(self):
         if self.current_state == "menu":
             SoundManager.handle_music_transition('Sounds/menu_theme.mp3')
@@ -219,15 +309,25 @@ class Game:
         if self.current_state == "game":
             SoundManager.handle_music_transition('Sounds/ambient_track.mp3')
             self.network_manager.process_network_updates()
+            self.update_ai()
             self.board.check_all_pieces_status()
 
-        self.game_drawer.draw(self.screen, self.valid_placement_squares, self.valid_moves, self.game_phase)
+        self.game_drawer.draw(self.screen, self.valid_placement_squares, self.valid_moves, self.game_phase,
+                              self.danger_squares())
         self.game_drawer.draw_reserve_pieces(self.screen, self.reserve_manager, self.selected_reserve_piece)
         self.game_ui.draw_log(self.screen)
 
         if self.current_state == "post_game":
             self.game_drawer.draw_game_over_screen(self.screen, self.winner)
 
+    def danger_squares(self):
+        """Squares of the side to move's pieces that the opponent attacks, when the overlay is on"""
+        if not self.show_danger or self.game_phase != "playing":
+            return []
+        opponent = PLAYER_2 if self.current_player == PLAYER_1 else PLAYER_1
+        threatened = self.board.get_attack_mask(opponent) & self.board.get_owner_mask(self.current_player)
+        return self.board.masks.squares(threatened)
+
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -241,6 +341,9 @@ class Game:
             if event.type == pygame.KEYDOWN and event.key == pygame.K_F11:
                 pygame.display.toggle_fullscreen()
 
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_d and self.current_state == "game":
+                self.show_danger = not self.show_danger
+
             if self.current_state == "menu":
                 self.menu.handle_event(event)
                 continue
@@ -1,6 +1,7 @@
 from movement_patterns import get_valid_moves
 from sound_manager import SoundManager
 from constants import *
+from move import Move
 
 
 class GameActionHandler:
@@ -28,7 +29,9 @@ class GameActionHandler:
             'reserved_piece_selected': reserved_piece_selected,
             'selected_reserve_piece': selected_reserve_piece,
             'sound_to_play': None,
-            'log_message': None
+            'log_message': None,
+            'played_action': None,
+            'captured': False
         }
 
         def _handle_reserve_placement(board_pos, center):
@@ -53,31 +56,8 @@ class GameActionHandler:
                 result['sound_to_play'] = 'de_select'
                 return
 
-            if self.board.place_piece(selected_reserve_piece, board_pos):
-                x, y = board_pos
-                result[
-                    'log_message'] = (f"Player {current_player} placed a {selected_reserve_piece.name} at "
-                                      f"{x + 1, self.board.size - y}")
-
-                player = selected_reserve_piece.owner
-                piece_index = self.reserve_manager.get_pieces(player).index(selected_reserve_piece)
-                self.reserve_manager.remove_piece(player, piece_index)
-                result['sound_to_play'] = 'place'
-
-                if selected_reserve_piece.name == "monarch":
-                    new_monarchs = monarchs_placed.copy()
-                    new_monarchs[player] = True
-                    result['new_monarchs_placed'] = new_monarchs
-                    if all(new_monarchs.values()):
-                        result['new_game_phase'] = "playing"
-
-                result['new_selected_piece'] = None
-                result['new_valid_moves'] = []
-                result['new_valid_placement_squares'] = []
-                result['new_player'] = PLAYER_2 if current_player == PLAYER_1 else PLAYER_1
-                result['turn_changed'] = True
-                result['action_taken'] = True
-                result['reserved_piece_selected'] = False
+            if self.board.get_piece(board_pos) is None:
+                self._play_action(Move(selected_reserve_piece.name, board_pos), current_player, result)
 
         def _handle_board_interaction(board_pos, clicked_piece_inside):
             safe_valid_moves = valid_moves if valid_moves is not None else []
@@ -91,41 +71,8 @@ class GameActionHandler:
                 _select_piece(clicked_piece_inside, board_pos)
 
         def _move_piece(board_pos, clicked_piece_inside):
-            old_pos = next(((x, y) for y, row in enumerate(self.board.board)
-                            for x, piece in enumerate(row) if piece == selected_piece), None)
-            x, y = board_pos
-
-            if clicked_piece_inside and clicked_piece_inside.owner != selected_piece.owner:
-                # Capture move
-                self.board.remove_piece(old_pos)
-                self.board.remove_piece(board_pos)
-                captured_piece = clicked_piece_inside
-                captured_piece.owner = current_player
-                self.board.place_piece(selected_piece, board_pos)
-
-                result['sound_to_play'] = 'capture'
-                result[
-                    'log_message'] = f"Player {current_player} captured {selected_piece.name} at {x + 1, BOARD_SIZE - y}"
-
-                if clicked_piece_inside.name == "monarch":
-                    result['sound_to_play'] = 'endgame'
-                    result['game_ended'] = True
-                    result['winner'] = PLAYER_1 if current_player == PLAYER_2 else PLAYER_2
-                else:
-                    self.reserve_manager.add_piece(captured_piece)
-            else:
-                # Normal move
-                self.board.remove_piece(old_pos)
-                self.board.place_piece(selected_piece, board_pos)
-                result[
-                    'log_message'] = f"Player {current_player} moved {selected_piece.name} to {x + 1, BOARD_SIZE - y}"
-                result['sound_to_play'] = 'slide'
-
-            result['new_selected_piece'] = None
-            result['new_valid_moves'] = []
-            result['new_player'] = PLAYER_2 if current_player == PLAYER_1 else PLAYER_1
-            result['turn_changed'] = True
-            result['action_taken'] = True
+            old_pos = self.board.find_piece(selected_piece)
+            self._play_action(Move(selected_piece.name, board_pos, old_pos), current_player, result)
 
         def _select_piece(clicked_piece_inside, board_pos):
             if not clicked_piece_inside:
@@ -152,7 +99,7 @@ class GameActionHandler:
                 result['sound_to_play'] = 'enemy_select'
 
         # Main logic
-        top_board_pos = self.board.get_board_position(pos, self.display)
+        top_board_pos = self.display.get_board_position(pos, self.board.size)
         top_center = self.board.size // 2
 
         if reserved_piece_selected:
@@ -163,6 +110,75 @@ class GameActionHandler:
 
         return result
 
+    def apply_action(self, action, current_player):
+        """Play a Move that didn't come from clicks, e.g. the AI's, and report it like a board click"""
+        game = self.board.game
+        result = {
+            'action_taken': False,
+            'game_ended': False,
+            'winner': None,
+            'turn_changed': False,
+            'new_player': current_player,
+            'new_selected_piece': None,
+            'new_valid_moves': [],
+            'new_valid_placement_squares': [],
+            'new_monarchs_placed': game.monarchs_placed,
+            'new_game_phase': game.game_phase,
+            'reserved_piece_selected': False,
+            'selected_reserve_piece': None,
+            'sound_to_play': None,
+            'log_message': None,
+            'played_action': None,
+            'captured': False
+        }
+        self._play_action(action, current_player, result)
+        return result
+
+    def _play_action(self, action, current_player, result):
+        x, y = action.target
+
+        # The board moves the pieces, fills the reserves and updates the turn
+        captured_piece = self.board.make_move(action)
+        result['played_action'] = action
+        result['captured'] = captured_piece is not None
+
+        if action.is_drop:
+            result[
+                'log_message'] = (f"Player {current_player} placed a {action.piece_name} at "
+                                  f"{x + 1, self.board.size - y}")
+            result['sound_to_play'] = 'place'
+        elif captured_piece is not None:
+            # Capture move
+            result['sound_to_play'] = 'capture'
+            result[
+                'log_message'] = f"Player {current_player} captured {action.piece_name} at {x + 1, BOARD_SIZE - y}"
+
+            if captured_piece.name == "monarch":
+                result['sound_to_play'] = 'endgame'
+                result['game_ended'] = True
+                result['winner'] = PLAYER_1 if current_player == PLAYER_2 else PLAYER_2
+        else:
+            # Normal move
+            result['log_message'] = f"Player {current_player} moved {action.piece_name} to {x + 1, BOARD_SIZE - y}"
+            result['sound_to_play'] = 'slide'
+
+        opponent = PLAYER_2 if current_player == PLAYER_1 else PLAYER_1
+        if not result['game_ended'] and self.board.is_monarch_attacked(opponent):
+            result['log_message'] += f", Player {opponent}'s monarch is under attack"
+
+        result['new_monarchs_placed'] = self.board.game.monarchs_placed
+        result['new_game_phase'] = self.board.game.game_phase
+        result['new_selected_piece'] = None
+        result['new_valid_moves'] = []
+        result['new_player'] = PLAYER_2 if current_player == PLAYER_1 else PLAYER_1
+        result['turn_changed'] = True
+        result['action_taken'] = True
+
+        if action.is_drop:
+            result['new_valid_placement_squares'] = []
+            result['reserved_piece_selected'] = False
+            result['selected_reserve_piece'] = None
+
     def handle_reserve_click(self, pos, current_player, selected_reserve_piece, reserved_piece_selected):
         from movement_patterns import get_valid_placement_squares
 
@@ -1,8 +1,9 @@
 import pygame
 import threading
 from draw import DrawUtilities
-from server import GameServer
+from server import AsyncGameServer
 from sound_manager import SoundManager
+from constants import PLAYER_2
 
 
 class Menu:
@@ -56,7 +57,7 @@ class Menu:
         button_spacing = 20
 
         # Calculate starting Y position for first button
-        start_y = current_height // 2 - (button_height * 2 + button_spacing * 1.5)
+        start_y = current_height // 2 - (button_height * 3 + button_spacing * 1.5)
 
         # Create buttons list with (rect, text) tuples and their borders
         self.buttons = []
@@ -64,6 +65,7 @@ class Menu:
 
         button_data = [
             "Play Local",
+            "Play vs AI",
             "Join Game",
             "Host Game",
             "How To Play",
@@ -189,9 +191,15 @@ class Menu:
             if button_rect.collidepoint(pos):
                 if text == "Play Local":
                     SoundManager.play_sound('play')
+                    self.game.ai_player = None
+                    self.show_setup_dialog = True
+                elif text == "Play vs AI":
+                    SoundManager.play_sound('play')
+                    self.game.ai_player = PLAYER_2
                     self.show_setup_dialog = True
                 elif text == "Join Game":
                     SoundManager.play_sound('join_game')
+                    self.game.ai_player = None
                     self.show_ip_dialog = True
                 elif text == "How To Play":
                     SoundManager.play_sound('how_to_play')
@@ -205,7 +213,7 @@ class Menu:
                 elif text == "Host Game":
                     SoundManager.play_sound('host_game')
                     if not hasattr(self, 'server') or self.server is None:
-                        self.server = GameServer()
+                        self.server = AsyncGameServer()
                         self.server_thread = threading.Thread(target=self.server.start)
                         self.server_thread.daemon = True
                         self.server_thread.start()
@@ -215,7 +223,9 @@ class Menu:
 
     def handle_ip_input(self, event):
         if event.key == pygame.K_RETURN:
-            self.game.network_manager.connect_to_server(self.ip_input, 5555)
+            # "ip/ROOM" joins a room on the server, a bare ip its default room
+            server_ip, _, room = self.ip_input.partition("/")
+            self.game.network_manager.connect_to_server(server_ip or "localhost", 5555, room or None)
             self.game.is_multiplayer = True
             self.game.current_state = "game"
             self.show_ip_dialog = False
@@ -223,8 +233,12 @@ class Menu:
             self.ip_input = self.ip_input[:-1]
         elif event.key == pygame.K_ESCAPE:
             self.show_ip_dialog = False
-        elif event.unicode in "0123456789.":
+        elif event.unicode and event.unicode in "0123456789.":
             self.ip_input += event.unicode
+        elif event.unicode and event.unicode.isascii() and (event.unicode.isalnum() or event.unicode == "/"):
+            # Letters only make sense in the room code after the slash
+            if "/" in self.ip_input or event.unicode == "/":
+                self.ip_input += event.unicode.upper()
 
     def _handle_settings_click(self, pos):
         current_width, current_height = self.display_manager.get_dimensions()
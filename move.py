@@ -0,0 +1,12 @@
+from typing import NamedTuple, Optional, Tuple
+
+
+class Move(NamedTuple):
+    """A single turn: a drop from the mover's reserve when origin is None, otherwise a board move"""
+    piece_name: str
+    target: Tuple[int, int]
+    origin: Optional[Tuple[int, int]] = None
+
+    @property
+    def is_drop(self) -> bool:
+        return self.origin is None
@@ -1,101 +1,114 @@
+from piece import intern_movement, is_interned
+
+# (id of interned movement set, board size) -> per-square tuple of rays
+_RAY_TABLES = {}
+
+
 def get_valid_placement_squares(board, piece):
-    valid_squares = set()  # Using a set to avoid duplicates
+    masks = board.masks
 
     if piece.name == "monarch":
-        center = board.size // 2
-        for y in range(board.size):
-            for x in range(board.size):
-                # Skip center square and occupied squares
-                if not ((x == center and y == center) or board.get_piece((x, y))):
-                    valid_squares.add((x, y))
-        return list(valid_squares)
-
-    if piece.name == "spy":
-        center = board.size // 2
-        for y in range(board.size):
-            for x in range(board.size):
-                # Skip center square and occupied squares
-                if not board.get_piece((x, y)):
-                    valid_squares.add((x, y))
-        return list(valid_squares)
-
-    # For other pieces, collect all squares that friendly pieces can move to
-    for y in range(board.size):
-        for x in range(board.size):
-            board_piece = board.get_piece((x, y))
-            if board_piece and board_piece.owner == piece.owner:
-                if board_piece.name == "spy":
-                    continue
-                if board_piece.name == "palace":
-                    # Add 5x5 area around palace
-                    for dy in range(-2, 3):  # -2, -1, 0, 1, 2
-                        for dx in range(-2, 3):  # -2, -1, 0, 1, 2
-                            new_x, new_y = x + dx, y + dy
-                            if (0 <= new_x < board.size and
-                                    0 <= new_y < board.size and
-                                    (board.get_piece((new_x, new_y)) is None or
-                                     board.get_piece((new_x, new_y)).owner != piece.owner)):
-                                valid_squares.add((new_x, new_y))
-                else:
-                    # Calculate actual squares by adding movement deltas to current position
-                    moves = [(x + dx, y + dy) for dx, dy in board_piece.movement_squares]
-                    # Filter moves based on board boundaries and piece ownership
-                    valid_moves = [
-                        (move_x, move_y) for move_x, move_y in moves
-                        if 0 <= move_x < board.size and 0 <= move_y < board.size
-                           and (board.get_piece((move_x, move_y)) is None
-                                or board.get_piece((move_x, move_y)).owner != board_piece.owner)
-                    ]
-                    valid_squares.update(valid_moves)
-
-    return list(valid_squares)
+        # Any empty square except the center
+        mask = masks.full & ~board.occupied & ~masks.center
+    elif piece.name == "spy":
+        # Any empty square
+        mask = masks.full & ~board.occupied
+    else:
+        # For other pieces, the squares friendly pieces can move to or palaces cover. The board
+        # keeps that up to date as pieces come and go, so this is a lookup
+        mask = board.get_coverage_mask(piece.owner) & ~board.get_owner_mask(piece.owner)
 
+    cache = board.move_cache
+    if cache is None:
+        return masks.squares(mask)
+    # The mask is the whole answer, so it is its own exact key
+    key = (board.size, mask)
+    squares = cache.get(key)
+    if squares is None:
+        squares = masks.squares(mask)
+        cache.put(key, squares)
+    return list(squares)
 
-def get_valid_moves(piece, x, y, board):
+
+def _build_rays(movement_squares, size):
     # Group movement squares by direction to check line of sight
     moves_by_direction = {}
-    for dx, dy in piece.movement_squares:
+    for dx, dy in movement_squares:
         # Normalize the direction to handle multistep moves
-        if dx != 0:
-            dx_norm = dx // abs(dx)
-        else:
-            dx_norm = 0
-        if dy != 0:
-            dy_norm = dy // abs(dy)
-        else:
-            dy_norm = 0
-        direction = (dx_norm, dy_norm)
-
-        # Store the full move under its direction
-        if direction not in moves_by_direction:
-            moves_by_direction[direction] = []
-        moves_by_direction[direction].append((dx, dy))
+        direction = ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+        moves_by_direction.setdefault(direction, []).append((dx, dy))
 
-    valid_moves = []
-    # Check each direction
-    for direction, moves in moves_by_direction.items():
+    for moves in moves_by_direction.values():
         # Sort moves by distance from current position
         moves.sort(key=lambda m: abs(m[0]) + abs(m[1]))
 
-        # Check each move in this direction until we hit a piece
-        for dx, dy in moves:
-            move_x, move_y = x + dx, y + dy
+    table = []
+    for y in range(size):
+        for x in range(size):
+            rays = []
+            for moves in moves_by_direction.values():
+                ray = []
+                for dx, dy in moves:
+                    move_x, move_y = x + dx, y + dy
+                    # Everything further along this direction is off the board too
+                    if not (0 <= move_x < size and 0 <= move_y < size):
+                        break
+                    ray.append((move_x, move_y))
+                if ray:
+                    rays.append(tuple(ray))
+            table.append(tuple(rays))
+    return table
+
 
-            # Check board boundaries
-            if not (0 <= move_x < board.size and 0 <= move_y < board.size):
-                break
+def get_ray_table(movement_squares, size):
+    """Per-square rays for a movement set, each ray listing its targets nearest first"""
+    # Keyed by the identity of the interned movement set, which skips hashing its tuples
+    try:
+        return _RAY_TABLES[id(movement_squares), size]
+    except KeyError:
+        movement_squares = intern_movement(movement_squares)
+        if not is_interned(movement_squares):
+            # Not one of the game's movement sets, its id could be reused once it's freed
+            return _build_rays(movement_squares, size)
+        key = (id(movement_squares), size)
+        table = _RAY_TABLES.get(key)
+        if table is None:
+            table = _RAY_TABLES[key] = _build_rays(movement_squares, size)
+        return table
 
-            target_piece = board.get_piece((move_x, move_y))
+
+def get_valid_moves(piece, x, y, board):
+    # Unpromoted advisors can't capture
+    can_capture = piece.promoted or piece.name != "advisor"
+
+    cache = board.move_cache
+    if cache is None:
+        return _generate_moves(piece, x, y, board, can_capture)
+    # Targets only depend on which squares are occupied and which of those are friendly,
+    # so those masks rather than a hash of the position make a key that can't go stale
+    key = (board.size, x, y, id(piece.movement_squares), can_capture,
+           board.occupied, board.get_owner_mask(piece.owner))
+    moves = cache.get(key)
+    if moves is None:
+        moves = _generate_moves(piece, x, y, board, can_capture)
+        cache.put(key, moves)
+    return list(moves)
+
+
+def _generate_moves(piece, x, y, board, can_capture):
+    grid = board.board
+    owner = piece.owner
+
+    valid_moves = []
+    for ray in get_ray_table(piece.movement_squares, board.size)[y * board.size + x]:
+        # Walk outwards until we hit a piece
+        for target in ray:
+            target_piece = grid[target[1]][target[0]]
             if target_piece is None:
-                # Empty square, add it and continue checking
-                valid_moves.append((move_x, move_y))
-            elif target_piece.owner != piece.owner:
-                # Enemy piece - only add if not an unpromoted advisor
-                if not (piece.name == "advisor" and not piece.promoted):
-                    valid_moves.append((move_x, move_y))
-                break
-            else:
-                # Friendly piece, stop checking this direction
-                break
+                valid_moves.append(target)
+                continue
+            if can_capture and target_piece.owner != owner:
+                valid_moves.append(target)
+            break
 
     return valid_moves
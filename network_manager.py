@@ -1,11 +1,17 @@
 from typing import Optional, Dict, Any, Callable
 import socket
-import json
 import threading
 import queue
 from pygame import mixer
 import pygame
 from piece import Piece  # You'll need to create this file
+from protocol import (FrameDecoder, READ_SIZE, RESYNC, action_message, decode_message, encode_message,
+                      encode_snapshot, hello_message, message_type, snapshot_message)
+from records.format import decode_action
+from rooms import join_message
+
+# Actions between the checkpoint snapshots a client leaves with the server
+SNAPSHOT_INTERVAL = 16
 
 
 class NetworkManager:
@@ -16,15 +22,36 @@ class NetworkManager:
         self.lock = threading.Lock()
         self.connected = False
         self.game = game
+        # Code of the server room we're in, and whether we're still waiting to hear it back
+        self.room = None
+        self.awaiting_join = False
+        # Actions applied in the synced game, whether we're waiting for a snapshot to
+        # catch up, and whether this game has had every action since its start (so it
+        # can be recorded)
+        self.seq = 0
+        self.resyncing = False
+        self.has_every_action = True
+        # Binary snapshot version the server agreed to, None for JSON snapshots
+        self.wire_format = None
         self.enemy_promote_sound = pygame.mixer.Sound("Sounds/enemy_promote.mp3")
 
 
-    def connect_to_server(self, server_ip: str = "localhost", port: int = 5555) -> bool:
+    def connect_to_server(self, server_ip: str = "localhost", port: int = 5555, room: Optional[str] = None) -> bool:
+        """Connect and, given a room code, join that room instead of the server's default one"""
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
             self.socket.connect((server_ip, port))
             print("Connected to server!")
             self.connected = True
+            self.room = None
+            self.awaiting_join = room is not None
+            self.seq = 0
+            self.resyncing = False
+            self.has_every_action = True
+            self.wire_format = None
+            self.socket.sendall(encode_message(hello_message()))
+            if room is not None:
+                self.socket.sendall(encode_message(join_message(room)))
             threading.Thread(target=self._network_thread, daemon=True).start()
             return True
         except Exception as e:
@@ -32,11 +59,44 @@ class NetworkManager:
             self.connected = False
             return False
 
-    def send_game_state(self):
-        """Serialize and send the current game state"""
+    def send(self, message) -> bool:
+        return self._send_frame(encode_message(message))
+
+    def _send_frame(self, frame) -> bool:
+        try:
+            self.socket.sendall(frame)
+            return True
+        except Exception as e:
+            print(f"Error sending to the server: {e}")
+            self.connected = False
+            return False
+
+    def send_action(self, action) -> bool:
+        """Send an action just played here, with a checkpoint snapshot every SNAPSHOT_INTERVAL actions"""
+        self.seq += 1
+        sent = self.send(action_message(self.seq, action, self.game.board.size, self.game.get_position_key()))
+        if sent and self.seq % SNAPSHOT_INTERVAL == 0:
+            sent = self.send_snapshot()
+        return sent
+
+    def send_snapshot(self) -> bool:
+        return self._send_frame(encode_snapshot(self.seq, self.serialize_game_state(), binary=self.wire_format is not None))
+
+    def send_new_game(self) -> bool:
+        """Tell the room this game was reset to the starting position"""
+        self.seq += 1
+        self.has_every_action = True
+        return self.send(snapshot_message(self.seq, None))
+
+    def request_resync(self) -> bool:
+        """Ask for the room's latest snapshot and the actions since, ignoring actions until it comes"""
+        self.resyncing = True
+        return self.send(RESYNC)
+
+    def serialize_game_state(self) -> Dict[str, Any]:
+        """The current game state as a JSON-ready dict, the inverse of update_game_state"""
         # Convert board to serializable format
         serialized_board = []
-        print(f"{self.game.board.i_promoted}")
         for row in self.game.board.board:
             serialized_row = []
             for piece in row:
@@ -78,19 +138,10 @@ class NetworkManager:
             "current_state": self.game.current_state,
             "winner": self.game.winner,
             "reserves": serialized_reserves,
-            "i_promoted": self.game.board.i_promoted
+            "i_promoted": self.game.board.i_promoted,
+            "position_key": self.game.get_position_key()
         }
-        print(f"Sent: {monarchs_placed}")
-
-        try:
-            state_string = json.dumps(game_state)
-            print("Client says: 'Sending data'")
-            self.socket.send(state_string.encode())
-            return True
-        except Exception as e:
-            print(f"Error sending game state: {e}")
-            self.connected = False
-            return False
+        return game_state
 
     def update_game_state(self, new_state):
         """Update the game state based on received network data"""
@@ -113,7 +164,7 @@ class NetworkManager:
                         new_row.append(None)
                 new_board.append(new_row)
 
-            self.game.board.board = new_board
+            self.game.board.load_grid(new_board)
             self.game.current_player = new_state["current_player"]
 
             # Convert monarchs_placed back to integer keys
@@ -137,14 +188,18 @@ class NetworkManager:
                             promoted=piece_data["promoted"]
                         )
                         new_reserves[player].append(piece)
-                self.game.reserve_manager.reserves = new_reserves
+                self.game.reserve_manager.load_reserves(new_reserves)
 
             self.game.game_phase = new_state["game_phase"]
             self.game.current_state = new_state["current_state"]
             self.game.winner = new_state["winner"]
 
+            expected_key = new_state.get("position_key")
+            if expected_key is not None and expected_key != self.game.get_position_key():
+                print("Warning: received game state doesn't match the sender's position key")
+
             did_enemy_promote = new_state.get("i_promoted", False)
-            print(f"{new_state["i_promoted"]}")
+            print(f"{new_state['i_promoted']}")
 
             if did_enemy_promote:
                 self.enemy_promote_sound.play()
@@ -155,33 +210,140 @@ class NetworkManager:
         except Exception as e:
             print(f"Error updating game state: {e}")
 
+    def apply_snapshot(self, message) -> None:
+        """Replace the game with a snapshot from the server"""
+        seq = message["seq"]
+        if message["state"] is None:
+            self.game.reset()
+            self.has_every_action = True
+        else:
+            self.update_game_state(message["state"])
+            if seq != self.seq:
+                # Jumped over actions, this game can't be recorded any more
+                self.has_every_action = False
+                self.game.close_record()
+        self.seq = seq
+        self.resyncing = False
+
+    def apply_action(self, message) -> None:
+        """Play the opponent's action, or ask for a resync if it doesn't follow on from ours"""
+        seq = message.get("seq")
+        if self.resyncing or not isinstance(seq, int) or seq <= self.seq:
+            # Waiting for a snapshot, or an action we already have
+            return
+        if seq > self.seq + 1:
+            print(f"Missed actions {self.seq + 1} to {seq - 1}, resyncing")
+            self.request_resync()
+            return
+
+        try:
+            action, _ = decode_action(*message["action"], self.game.board.size)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Unreadable action {seq}, resyncing: {e}")
+            self.request_resync()
+            return
+        if not self._is_playable(action):
+            print(f"Action {seq} ({action}) doesn't fit our position, resyncing")
+            self.request_resync()
+            return
+
+        # The opponent's promotions get their own sound, not ours
+        board = self.game.board
+        on_promote = board.on_promote
+        board.on_promote = None
+        try:
+            self.game.apply_network_action(action)
+        finally:
+            board.on_promote = on_promote
+        self.seq = seq
+        if board.i_promoted:
+            self.enemy_promote_sound.play()
+
+        expected_key = message.get("key")
+        if expected_key is not None and expected_key != self.game.get_position_key():
+            print(f"Position after action {seq} doesn't match the sender's, resyncing")
+            self.request_resync()
+
+    def _is_playable(self, action) -> bool:
+        # Enough to keep a bad action from corrupting the board, the sender checked the rest
+        board = self.game.board
+        player = self.game.current_player
+        if not board.is_valid_position(action.target):
+            return False
+        target = board.get_piece(action.target)
+        if action.origin is None:
+            return target is None and any(piece.name == action.piece_name
+                                          for piece in self.game.reserve_manager.get_pieces(player))
+        if not board.is_valid_position(action.origin):
+            return False
+        piece = board.get_piece(action.origin)
+        return (piece is not None and piece.owner == player and piece.name == action.piece_name
+                and (target is None or target.owner != player))
+
+    def handle_update(self, message) -> None:
+        kind = message_type(message)
+        if kind == "snapshot":
+            self.apply_snapshot(message)
+        elif kind == "action":
+            self.apply_action(message)
+        else:
+            # A whole state from a client that predates actions
+            self.update_game_state(message)
+
     def process_network_updates(self) -> None:
         """Process any pending network updates and apply them to the game state"""
         try:
             while not self.update_queue.empty():
-                new_state = self.update_queue.get_nowait()
+                message = self.update_queue.get_nowait()
                 with self.lock:
-                    self.update_game_state(new_state)
+                    self.handle_update(message)
         except queue.Empty:
             pass
 
     def _network_thread(self) -> None:
+        decoder = FrameDecoder()
         while self.connected:
             try:
-                data = self.socket.recv(4096)
-                if data:
-                    new_state = json.loads(data.decode())
-                    print("Client says: 'Pushing received data into queue'")
-                    self.update_queue.put(new_state)
+                data = self.socket.recv(READ_SIZE)
+                if not data:
+                    print("Server closed the connection")
+                    self.connected = False
+                    break
+                # Every message completed by this read, there can be several
+                for payload in decoder.feed(data):
+                    try:
+                        self._handle_message(decode_message(payload))
+                    except ValueError as e:
+                        print(f"Dropped a message that isn't JSON: {e}")
             except Exception as e:
                 print(f"Network error: {e}")
                 self.connected = False
                 break
 
+    def _handle_message(self, message) -> None:
+        if not isinstance(message, dict):
+            print("Dropped a message that isn't a game state")
+        elif message_type(message) == "hello":
+            # From the server only, it never forwards a peer's
+            self.wire_format = message.get("wire_format")
+        elif "joined" in message:
+            print(f"Joined room {message['joined']}")
+            self.room = message["joined"]
+            self.awaiting_join = False
+        elif "error" in message:
+            print(f"Server refused us: {message['error']}")
+            self.connected = False
+        elif not self.awaiting_join:
+            # Anything before our join is confirmed is from the default room we started in
+            print("Client says: 'Pushing received data into queue'")
+            self.update_queue.put(message)
+
     def disconnect(self) -> None:
         self.connected = False
         if self.socket:
             try:
+                # Wakes the network thread out of recv, so the server sees us leave the room now
+                self.socket.shutdown(socket.SHUT_RDWR)
                 self.socket.close()
             except Exception as e:
                 print(f"Error closing socket: {e}")
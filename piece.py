@@ -1,6 +1,64 @@
+# Every movement set in the game. Pieces share these tuples instead of holding
+# their own lists, so a piece costs the same few slots whatever it can do.
+KING_MOVES = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+ORTHOGONAL_MOVES = ((0, 1), (0, -1), (1, 0), (-1, 0))
+ORTHOGONAL_2_MOVES = ((0, 1), (0, -1), (1, 0), (-1, 0), (0, 2), (0, -2), (2, 0), (-2, 0))
+ADVISOR_MOVES = ((3, 3), (3, -3), (-3, 3), (-3, -3), (2, 2), (2, -2), (-2, 2), (-2, -2), (1, 1), (1, -1), (-1, 1),
+                 (-1, -1))
+PROMOTED_MOVES = ((2, 2), (2, -2), (-2, 2), (-2, -2), (0, 2), (0, -2), (2, 0), (-2, 0), (0, 1), (0, -1), (1, 0),
+                  (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+# (name, promotion context) -> movement set. The context is None for an unpromoted
+# piece and otherwise names what it was promoted by.
+MOVEMENT_TABLES = {
+    ("monarch", None): KING_MOVES,
+    ("monarch", "promoted"): PROMOTED_MOVES,
+    ("advisor", None): ADVISOR_MOVES,
+    ("advisor", "monarch"): PROMOTED_MOVES,
+    ("official", None): ORTHOGONAL_MOVES,
+    ("official", "monarch"): KING_MOVES,
+    ("official", "advisor"): ORTHOGONAL_2_MOVES,
+    ("palace", None): (),
+    ("spy", None): KING_MOVES
+}
+
+_INTERNED = {movement_squares: movement_squares for movement_squares in MOVEMENT_TABLES.values()}
+
+
+def movement_for(name, context=None):
+    return MOVEMENT_TABLES[name, context]
+
+
+def intern_movement(movement_squares):
+    """The shared tuple equal to a movement set, e.g. one decoded from JSON as lists.
+
+    A set that isn't in MOVEMENT_TABLES comes back as a plain tuple and isn't kept,
+    so a peer sending made-up movement sets can't grow the table.
+    """
+    try:
+        return _INTERNED[movement_squares]
+    except (KeyError, TypeError):
+        key = tuple(tuple(delta) for delta in movement_squares)
+        return _INTERNED.get(key, key)
+
+
+def is_interned(movement_squares) -> bool:
+    """Whether a movement set is one of the shared tuples, which live as long as the process"""
+    try:
+        return _INTERNED.get(movement_squares) is movement_squares
+    except TypeError:
+        return False
+
+
 class Piece:
+    __slots__ = ("name", "movement_squares", "owner", "promoted")
+
     def __init__(self, name, movement_squares, owner, promoted=False):
         self.name = name
-        self.movement_squares = movement_squares
+        self.movement_squares = intern_movement(movement_squares)
         self.owner = owner
         self.promoted = promoted
+
+    def __reduce__(self):
+        # Through __init__, so an unpickled piece shares the interned movement set again
+        return Piece, (self.name, self.movement_squares, self.owner, self.promoted)
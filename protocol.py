@@ -0,0 +1,135 @@
+"""Message framing for the client/server connection.
+
+TCP is a byte stream: one send can arrive split over several reads and several
+sends can arrive in one. Every message therefore goes out as a frame, a 4 byte
+big-endian payload length followed by the payload, UTF-8 JSON here:
+
+    +----------------+---------------------+
+    | length (>I)    | payload (length B)  |
+    +----------------+---------------------+
+
+FrameDecoder is fed whatever each read returned and hands back every frame it
+completed, keeping a partial one buffered until the rest arrives.
+
+A game is kept in sync with small typed messages rather than whole states:
+
+    {"type": "action", "seq": N, "action": [code, origin, target], "key": K}
+        the Nth action of the game, encoded as in records/format.py, and the
+        position key it leads to so the receiver can check it arrived at the same place
+    {"type": "snapshot", "seq": N, "state": {...}}
+        the whole game after N actions, NetworkManager.serialize_game_state's dict,
+        or null for the starting position
+    {"type": "resync"}
+        asks the server for its latest snapshot and every action since
+    {"type": "hello", "wire_formats": [1]}
+        the binary snapshot versions a client can read, see wire_format.py. The
+        server answers {"type": "hello", "wire_format": 1} with the version both
+        sides will use, or null, and until then snapshots are sent as JSON
+
+A binary snapshot payload starts with wire_format.MAGIC instead of "{" and
+decode_message turns it into the same dict as its JSON form.
+"""
+import json
+import struct
+import wire_format
+from records.format import action_fields
+
+LENGTH = struct.Struct(">I")
+# Far above the biggest game state, a length past this means the stream is garbage
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Bytes asked for per read
+READ_SIZE = 65536
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(payload: bytes) -> bytes:
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes is over the {MAX_FRAME_SIZE} byte limit")
+    return LENGTH.pack(len(payload)) + payload
+
+
+def encode_message(message) -> bytes:
+    """One JSON message as a frame"""
+    return encode_frame(json.dumps(message, separators=(",", ":")).encode())
+
+
+def decode_message(payload: bytes):
+    """The message in a frame's payload, raises ValueError if it isn't one"""
+    if wire_format.is_binary(payload):
+        return wire_format.decode_snapshot(payload)
+    return json.loads(payload.decode())
+
+
+def to_json_frame(frame: bytes) -> bytes:
+    """A frame re-encoded as JSON if it holds a binary snapshot, for peers that can't read those"""
+    if wire_format.is_binary(frame[LENGTH.size:]):
+        return encode_message(decode_message(frame[LENGTH.size:]))
+    return frame
+
+
+class FrameDecoder:
+    """Reassembles frames from a stream of reads"""
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def __len__(self):
+        """Bytes buffered towards the next frame"""
+        return len(self._buffer)
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Add the bytes of one read, returning the payload of every frame completed by them.
+
+        Raises ProtocolError on a frame longer than max_frame_size, after which the
+        stream can't be trusted and the connection should be closed.
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = 0
+        # Walk the buffer and cut it once at the end, not once per frame
+        while len(buffer) - start >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(buffer, start)
+            if length > self.max_frame_size:
+                raise ProtocolError(f"Frame of {length} bytes is over the {self.max_frame_size} byte limit")
+            end = start + LENGTH.size + length
+            if len(buffer) < end:
+                break
+            frames.append(bytes(buffer[start + LENGTH.size:end]))
+            start = end
+        if start:
+            del buffer[:start]
+        return frames
+
+
+RESYNC = {"type": "resync"}
+
+
+def action_message(seq, action, size, key) -> dict:
+    return {"type": "action", "seq": seq, "action": list(action_fields(action, size)), "key": key}
+
+
+def snapshot_message(seq, state) -> dict:
+    return {"type": "snapshot", "seq": seq, "state": state}
+
+
+def encode_snapshot(seq, state, binary=False) -> bytes:
+    """A snapshot as a frame, in the binary wire format if the connection negotiated it"""
+    if binary and state is not None:
+        return encode_frame(wire_format.encode_snapshot(seq, state))
+    return encode_message(snapshot_message(seq, state))
+
+
+def hello_message() -> dict:
+    return {"type": "hello", "wire_formats": [wire_format.VERSION]}
+
+
+def message_type(message):
+    """The type of a message, None for an untyped one, e.g. a whole state from an old client"""
+    if isinstance(message, dict):
+        return message.get("type")
+    return None
@@ -0,0 +1,6 @@
+"""Compact binary game records, the writer the game uses and the replay engine that reads them."""
+from records.format import GameRecord, RecordError
+from records.writer import RecordWriter
+from records.replay import Replay
+
+__all__ = ["GameRecord", "RecordError", "RecordWriter", "Replay"]
@@ -0,0 +1,276 @@
+"""Statistics over a directory of game records.
+
+Records are streamed through generator stages, so only one game is held in memory
+at a time:
+
+    iter_record_paths -> parse -> extract (replay + features) -> aggregate
+
+With --workers the paths are handed out in batches to a process pool, each worker
+runs the same stages over its batch and the partial summaries are merged.
+
+Run from the repository root:
+    python -m records.analytics GameRecords [--workers 8] [--output summary.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from constants import PLAYER_1
+from records.format import GameRecord, RecordError
+from records.replay import Replay
+from zobrist import PIECE_NAMES
+
+RECORD_SUFFIX = ".sjr"
+BATCH_SIZE = 500
+
+
+def iter_record_paths(root):
+    """Every record file below root, in a stable order"""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.endswith(RECORD_SUFFIX):
+                yield os.path.join(directory, name)
+
+
+def parse(paths):
+    """GameRecord per path, or the RecordError/OSError that stopped it from loading"""
+    for path in paths:
+        try:
+            yield GameRecord.load(path)
+        except (OSError, RecordError) as e:
+            yield RecordError(f"{path}: {e}")
+
+
+def extract(records):
+    """Replay each record and yield its features, passing errors through"""
+    for record in records:
+        if isinstance(record, Exception):
+            yield record
+            continue
+        try:
+            yield game_features(record)
+        except RecordError as e:
+            yield e
+
+
+def _is_promoted(replay, square):
+    # Board.handle_status for a settled position, only monarchs need their history
+    owner, name = replay.squares[square]
+    if name == "monarch":
+        return replay.monarch_promoted(owner)
+    if name not in ("advisor", "official"):
+        return False
+    squares = replay.squares
+    for neighbour in replay.neighbours(square):
+        cell = squares[neighbour]
+        if cell is not None and cell[0] == owner and (
+                cell[1] == "monarch" or (name == "official" and cell[1] == "advisor")):
+            return True
+    return False
+
+
+def game_features(record):
+    """Size, length, winner, and drops, promotions and captured squares of one game"""
+    replay = Replay(record)
+    squares = replay.squares
+    size = record.size
+    drops = dict.fromkeys(PIECE_NAMES, 0)
+    promotions = dict.fromkeys(PIECE_NAMES, 0)
+    captures = []
+    # Promotion of each occupied square after the previous action
+    promoted = {}
+
+    for action, captured in zip(record.actions, record.captures):
+        target = action.target[1] * size + action.target[0]
+        if action.origin is None:
+            drops[action.piece_name] += 1
+            changed = [target]
+            was_promoted = False
+        else:
+            origin = action.origin[1] * size + action.origin[0]
+            changed = [origin, target]
+            was_promoted = promoted.pop(origin, False)
+            if captured:
+                captures.append(target)
+        promoted.pop(target, None)
+        replay.step()
+        promoted[target] = was_promoted
+
+        # Only pieces on or next to a changed square can change promotion
+        for square in changed + [n for square in changed for n in replay.neighbours(square)]:
+            if squares[square] is None:
+                continue
+            now = _is_promoted(replay, square)
+            if now and not promoted.get(square, False):
+                promotions[squares[square][1]] += 1
+            promoted[square] = now
+
+    return {
+        "size": size,
+        "actions": len(record),
+        "winner": replay.winner,
+        "drops": drops,
+        "promotions": promotions,
+        "captures": captures,
+    }
+
+
+class ArchiveSummary:
+    """Running totals over games, mergeable across processes"""
+
+    def __init__(self):
+        self.games = 0
+        self.skipped = 0
+        self.errors = []
+        # Per board size
+        self.games_by_size = {}
+        self.decided_by_size = {}
+        self.first_player_wins_by_size = {}
+        self.actions_by_size = {}
+        self.drops_by_size = {}
+        self.capture_heatmaps = {}
+        self.promotions = dict.fromkeys(PIECE_NAMES, 0)
+
+    def add(self, features):
+        if isinstance(features, Exception):
+            self.skipped += 1
+            # Keep a few for the report, not all of them
+            if len(self.errors) < 20:
+                self.errors.append(str(features))
+            return
+
+        size = features["size"]
+        self.games += 1
+        self.games_by_size[size] = self.games_by_size.get(size, 0) + 1
+        self.actions_by_size[size] = self.actions_by_size.get(size, 0) + features["actions"]
+        if features["winner"] is not None:
+            self.decided_by_size[size] = self.decided_by_size.get(size, 0) + 1
+            if features["winner"] == PLAYER_1:
+                self.first_player_wins_by_size[size] = self.first_player_wins_by_size.get(size, 0) + 1
+
+        drops = self.drops_by_size.setdefault(size, dict.fromkeys(PIECE_NAMES, 0))
+        for name, count in features["drops"].items():
+            drops[name] += count
+        for name, count in features["promotions"].items():
+            self.promotions[name] += count
+        heatmap = self.capture_heatmaps.setdefault(size, [0] * (size * size))
+        for square in features["captures"]:
+            heatmap[square] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.skipped += other.skipped
+        self.errors.extend(other.errors[:max(0, 20 - len(self.errors))])
+        for mine, theirs in ((self.games_by_size, other.games_by_size),
+                             (self.decided_by_size, other.decided_by_size),
+                             (self.first_player_wins_by_size, other.first_player_wins_by_size),
+                             (self.actions_by_size, other.actions_by_size),
+                             (self.promotions, other.promotions)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        for size, drops in other.drops_by_size.items():
+            mine = self.drops_by_size.setdefault(size, dict.fromkeys(PIECE_NAMES, 0))
+            for name, count in drops.items():
+                mine[name] += count
+        for size, heatmap in other.capture_heatmaps.items():
+            mine = self.capture_heatmaps.setdefault(size, [0] * (size * size))
+            for square, count in enumerate(heatmap):
+                mine[square] += count
+        return self
+
+    def report(self):
+        """JSON-ready summary"""
+        by_size = {}
+        for size in sorted(self.games_by_size):
+            games = self.games_by_size[size]
+            decided = self.decided_by_size.get(size, 0)
+            drops = self.drops_by_size[size]
+            by_size[str(size)] = {
+                "games": games,
+                "average_actions": self.actions_by_size[size] / games,
+                "decided_games": decided,
+                "first_player_win_rate": self.first_player_wins_by_size.get(size, 0) / decided if decided else None,
+                "average_drops": sum(drops.values()) / games,
+                "average_drops_by_piece": {name: count / games for name, count in drops.items()},
+                "capture_heatmap": [self.capture_heatmaps[size][row * size:(row + 1) * size]
+                                    for row in range(size)],
+            }
+        return {
+            "games": self.games,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "promotions_per_game": {name: count / self.games if self.games else 0.0
+                                    for name, count in self.promotions.items()},
+            "by_size": by_size,
+        }
+
+
+def aggregate(features, summary=None) -> ArchiveSummary:
+    summary = ArchiveSummary() if summary is None else summary
+    for game in features:
+        summary.add(game)
+    return summary
+
+
+def analyse_paths(paths) -> ArchiveSummary:
+    """Run every stage over some record paths, also the unit of work of each worker"""
+    return aggregate(extract(parse(paths)))
+
+
+def analyse(root, workers=1, batch_size=BATCH_SIZE) -> ArchiveSummary:
+    paths = iter_record_paths(root)
+    if workers <= 1:
+        return analyse_paths(paths)
+
+    summary = ArchiveSummary()
+    batches = iter(lambda: list(itertools.islice(paths, batch_size)), [])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # A couple of batches in flight per worker, so paths are never all listed at once
+        pending = {executor.submit(analyse_paths, batch) for batch in itertools.islice(batches, workers * 2)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                summary.merge(future.result())
+                for batch in itertools.islice(batches, 1):
+                    pending.add(executor.submit(analyse_paths, batch))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a directory of Seiji game records")
+    parser.add_argument("root", help="directory searched for .sjr files")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, 1 runs in this process")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="records per worker task")
+    parser.add_argument("--output", help="write the full summary, heatmaps included, to this JSON file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary = analyse(args.root, args.workers, args.batch_size)
+    elapsed = time.perf_counter() - start
+    report = summary.report()
+
+    print(f"{summary.games} games in {elapsed:.1f}s ({summary.games / max(elapsed, 1e-9):.0f} games/s), "
+          f"{summary.skipped} skipped")
+    for error in summary.errors:
+        print(f"  {error}")
+    print("Promotions per game: " + ", ".join(f"{name} {rate:.2f}"
+                                               for name, rate in report["promotions_per_game"].items()))
+    print(f"{'size':>4} {'games':>8} {'actions':>8} {'drops':>6} {'P1 wins':>8}")
+    for size, stats in report["by_size"].items():
+        win_rate = stats["first_player_win_rate"]
+        print(f"{size:>4} {stats['games']:>8} {stats['average_actions']:>8.1f} {stats['average_drops']:>6.1f} "
+              f"{'-' if win_rate is None else f'{win_rate:.1%}':>8}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=1)
+            output_file.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
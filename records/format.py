@@ -0,0 +1,124 @@
+"""Binary game records.
+
+A record is a header followed by one fixed-width entry per action, in the order
+they were played:
+
+    header   magic "SJR", version, board size, starting reserve of advisors,
+             officials, palaces and spies (one byte each)
+    action   code (B), origin square (H), target square (H), little-endian
+
+The code holds the piece type in its low bits and the DROP/MOVE and CAPTURE
+flags above them. Squares are y * size + x, NO_SQUARE standing in for the origin
+of a drop. A game on a 9x9 board takes 10 bytes plus 5 per action.
+"""
+import struct
+from constants import PIECE_COUNTS, MIN_BOARD_SIZE, MAX_BOARD_SIZE
+from move import Move
+from zobrist import PIECE_NAMES
+
+MAGIC = b"SJR"
+VERSION = 1
+HEADER = struct.Struct("<3sBB4B")
+ACTION = struct.Struct("<BHH")
+
+PIECE_MASK = 0x07
+MOVE = 0x10
+CAPTURE = 0x20
+NO_SQUARE = 0xFFFF
+
+# Order of the reserve counts in the header
+COUNTED_PIECES = ("advisor", "official", "palace", "spy")
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES)}
+
+
+class RecordError(ValueError):
+    pass
+
+
+def action_fields(action, size, captured=False):
+    """(code, origin, target) of an action entry"""
+    code = PIECE_CODES[action.piece_name]
+    origin = NO_SQUARE
+    if not action.is_drop:
+        code |= MOVE
+        origin = action.origin[1] * size + action.origin[0]
+    if captured:
+        code |= CAPTURE
+    return code, origin, action.target[1] * size + action.target[0]
+
+
+def encode_action(action, size, captured=False) -> bytes:
+    return ACTION.pack(*action_fields(action, size, captured))
+
+
+def decode_action(code, origin, target, size):
+    """(Move, whether it captured) from the fields of one action entry"""
+    try:
+        name = PIECE_NAMES[code & PIECE_MASK]
+    except IndexError:
+        raise RecordError(f"Unknown piece code {code & PIECE_MASK}") from None
+    target_square = (target % size, target // size)
+    if code & MOVE:
+        action = Move(name, target_square, (origin % size, origin // size))
+    else:
+        action = Move(name, target_square)
+    return action, bool(code & CAPTURE)
+
+
+def encode_header(size, piece_counts=None) -> bytes:
+    piece_counts = PIECE_COUNTS if piece_counts is None else piece_counts
+    return HEADER.pack(MAGIC, VERSION, size, *(piece_counts.get(name, 0) for name in COUNTED_PIECES))
+
+
+class GameRecord:
+    """The actions of one game with the board size and reserves it started from"""
+
+    def __init__(self, size, piece_counts=None, actions=None, captures=None):
+        self.size = size
+        self.piece_counts = dict(PIECE_COUNTS if piece_counts is None else piece_counts)
+        self.actions = list(actions or [])
+        # Whether each action captured a piece, as seen by whoever wrote the record
+        self.captures = list(captures or [False] * len(self.actions))
+
+    def __len__(self):
+        return len(self.actions)
+
+    def append(self, action, captured=False):
+        self.actions.append(action)
+        self.captures.append(captured)
+
+    def to_bytes(self) -> bytes:
+        parts = [encode_header(self.size, self.piece_counts)]
+        parts.extend(encode_action(action, self.size, captured)
+                     for action, captured in zip(self.actions, self.captures))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size:
+            raise RecordError("Record is shorter than its header")
+        magic, version, size, *counts = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise RecordError("Not a Seiji game record")
+        if version != VERSION:
+            raise RecordError(f"Unsupported record version {version}")
+        if not MIN_BOARD_SIZE <= size <= MAX_BOARD_SIZE:
+            raise RecordError(f"Invalid board size {size}")
+        # A writer that was cut off mid-entry leaves a partial action at the end, drop it
+        end = len(data) - (len(data) - HEADER.size) % ACTION.size
+
+        record = cls(size, dict(zip(COUNTED_PIECES, counts)))
+        for code, origin, target in ACTION.iter_unpack(data[HEADER.size:end]):
+            action, captured = decode_action(code, origin, target, size)
+            record.actions.append(action)
+            record.captures.append(captured)
+        return record
+
+    def save(self, path):
+        with open(path, "wb") as record_file:
+            record_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as record_file:
+            return cls.from_bytes(record_file.read())
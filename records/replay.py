@@ -0,0 +1,273 @@
+"""Rebuild positions from a game record.
+
+Run from the repository root to audit a game:
+
+    python -m records.replay GameRecords/<file>.sjr [--index N] [--legal] [--benchmark]
+"""
+import argparse
+import sys
+import time
+from constants import PLAYER_1, PLAYER_2
+from piece import Piece, movement_for
+from reserve_manager import ReserveManager
+from rules.engine import legal_actions
+from rules.state import GameState
+from records.format import GameRecord, RecordError
+
+# Actions between stored snapshots, seeking replays at most this many
+CHECKPOINT_INTERVAL = 256
+
+PIECE_LETTERS = {"monarch": "M", "advisor": "A", "official": "O", "palace": "P", "spy": "S"}
+
+
+_NEIGHBOURS_BY_SIZE = {}
+
+
+def _neighbour_lists(size):
+    neighbours = _NEIGHBOURS_BY_SIZE.get(size)
+    if neighbours is None:
+        neighbours = _NEIGHBOURS_BY_SIZE[size] = [
+            [ny * size + nx for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y))
+             if 0 <= nx < size and 0 <= ny < size]
+            for y in range(size) for x in range(size)]
+    return neighbours
+
+
+class Replay:
+    """Steps through a record and rebuilds the position after any number of actions.
+
+    Replaying doesn't go through Board: squares only hold (owner, name), reserves
+    only names, and a GameState is built when a position is asked for. Promotion is
+    settled at that point, since it only depends on the neighbours of each piece,
+    except for a promoted monarch which keeps its promotion until it's left with no
+    neighbours at all. That one flag per monarch is tracked as the game goes.
+
+    Every action is checked against the position before it: the piece has to be
+    there (or in the reserve) and belong to the side to move, and a capture has to
+    happen exactly when the record says one did. With check_legal the action also
+    has to be among the legal actions, which is much slower.
+    """
+
+    def __init__(self, record, check_legal=False):
+        self.record = record
+        self.check_legal = check_legal
+        size = record.size
+        self._neighbours = _neighbour_lists(size)
+
+        reserves = ReserveManager(record.piece_counts).reserves
+        self._checkpoints = [(
+            [None] * (size * size),
+            {player: [piece.name for piece in pieces] for player, pieces in reserves.items()},
+            PLAYER_1, "monarch_placement", {PLAYER_1: False, PLAYER_2: False}, None, {}, {}
+        )]
+        self._restore(0)
+
+    def __len__(self):
+        return len(self.record)
+
+    @property
+    def squares(self):
+        """(owner, name) or None for every square of the current position, at y * size + x. Read only."""
+        return self._grid
+
+    def neighbours(self, square):
+        """Indices of the orthogonal neighbours of a square"""
+        return self._neighbours[square]
+
+    def monarch_promoted(self, owner) -> bool:
+        return self._monarchs_promoted.get(owner, False)
+
+    def _restore(self, checkpoint):
+        (grid, reserves, self.current_player, self.game_phase, monarchs_placed, self.winner,
+         monarch_squares, monarchs_promoted) = self._checkpoints[checkpoint]
+        self._grid = grid[:]
+        self._reserves = {player: names[:] for player, names in reserves.items()}
+        self.monarchs_placed = dict(monarchs_placed)
+        self._monarch_squares = dict(monarch_squares)
+        self._monarchs_promoted = dict(monarchs_promoted)
+        self.index = checkpoint * CHECKPOINT_INTERVAL
+
+    def _store_checkpoint(self):
+        self._checkpoints.append((
+            self._grid[:], {player: names[:] for player, names in self._reserves.items()},
+            self.current_player, self.game_phase, dict(self.monarchs_placed), self.winner,
+            dict(self._monarch_squares), dict(self._monarchs_promoted)
+        ))
+
+    def step(self):
+        """Apply the next action, returning False at the end of the record"""
+        index = self.index
+        if index >= len(self.record):
+            return False
+        action = self.record.actions[index]
+        if self.check_legal and action not in legal_actions(self.to_state()):
+            raise RecordError(f"Action {index} ({action}) isn't legal")
+        if self.winner is not None:
+            raise RecordError(f"Action {index} ({action}) comes after the game was won")
+
+        size = self.record.size
+        grid = self._grid
+        player = self.current_player
+        name = action.piece_name
+        x, y = action.target
+        if not (0 <= x < size and 0 <= y < size):
+            raise RecordError(f"Action {index} ({action}) targets a square off the board")
+        target = y * size + x
+        occupant = grid[target]
+        if (occupant is not None) != self.record.captures[index]:
+            raise RecordError(f"Action {index} ({action}) capture doesn't match the record")
+
+        if action.origin is None:
+            if occupant is not None:
+                raise RecordError(f"Action {index} ({action}) drops onto an occupied square")
+            try:
+                self._reserves[player].remove(name)
+            except ValueError:
+                raise RecordError(f"Action {index} ({action}) drops a piece its player doesn't hold") from None
+            if name == "monarch":
+                self.monarchs_placed[player] = True
+                self._monarchs_promoted[player] = False
+                if all(self.monarchs_placed.values()):
+                    self.game_phase = "playing"
+        else:
+            x, y = action.origin
+            origin = y * size + x
+            if not (0 <= x < size and 0 <= y < size) or grid[origin] != (player, name):
+                raise RecordError(f"Action {index} ({action}) moves a piece that isn't there")
+            if occupant is not None and occupant[0] == player:
+                raise RecordError(f"Action {index} ({action}) captures its own piece")
+            grid[origin] = None
+            if occupant is not None:
+                if occupant[1] == "monarch":
+                    del self._monarch_squares[occupant[0]]
+                    self.winner = player
+                else:
+                    self._reserves[player].append(occupant[1])
+
+        grid[target] = (player, name)
+        if name == "monarch":
+            self._monarch_squares[player] = target
+        self.current_player = PLAYER_2 if player == PLAYER_1 else PLAYER_1
+        self._update_monarchs()
+
+        self.index = index + 1
+        if self.index == len(self._checkpoints) * CHECKPOINT_INTERVAL:
+            self._store_checkpoint()
+        return True
+
+    def _update_monarchs(self):
+        # Same rules as Board.handle_status for monarchs
+        grid = self._grid
+        for owner, square in self._monarch_squares.items():
+            neighbours = [grid[n] for n in self._neighbours[square] if grid[n] is not None]
+            if self._monarchs_promoted[owner]:
+                if not neighbours:
+                    self._monarchs_promoted[owner] = False
+            elif (neighbours and all(o == owner for o, _ in neighbours)
+                  and (owner, "palace") not in neighbours):
+                self._monarchs_promoted[owner] = True
+
+    def seek(self, index):
+        """Move to the position after the first index actions, replaying from the nearest checkpoint"""
+        index = max(0, min(index, len(self.record)))
+        checkpoint = min(index // CHECKPOINT_INTERVAL, len(self._checkpoints) - 1)
+        if index < self.index or checkpoint * CHECKPOINT_INTERVAL > self.index:
+            self._restore(checkpoint)
+        while self.index < index:
+            self.step()
+        return self.index
+
+    def to_state(self) -> GameState:
+        """A new GameState holding the current position, ready for make/unmake"""
+        size = self.record.size
+        state = GameState(size, self.record.piece_counts)
+
+        grid = [[None] * size for _ in range(size)]
+        for square, cell in enumerate(self._grid):
+            if cell is None:
+                continue
+            owner, name = cell
+            if name == "monarch" and self._monarchs_promoted[owner]:
+                piece = Piece(name, movement_for("monarch", "promoted"), owner, True)
+            else:
+                piece = Piece(name, movement_for(name), owner)
+            grid[square // size][square % size] = piece
+        state.board.load_grid(grid)
+        state.reserve_manager.load_reserves({
+            player: [Piece(name, movement_for(name), player) for name in names]
+            for player, names in self._reserves.items()
+        })
+        state.board.check_all_pieces_status()
+
+        state.current_player = self.current_player
+        state.game_phase = self.game_phase
+        state.monarchs_placed = dict(self.monarchs_placed)
+        state.winner = self.winner
+        return state
+
+    def position_at(self, index) -> GameState:
+        """The position after the first index actions"""
+        self.seek(index)
+        return self.to_state()
+
+
+def format_board(board) -> str:
+    """Player 1's pieces in capitals, player 2's in lower case, promoted ones marked with +"""
+    lines = []
+    for row in board.board:
+        cells = []
+        for piece in row:
+            if piece is None:
+                cells.append(" .")
+                continue
+            letter = PIECE_LETTERS[piece.name]
+            if piece.owner != PLAYER_1:
+                letter = letter.lower()
+            cells.append(("+" if piece.promoted else " ") + letter)
+        lines.append("".join(cells))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a Seiji game record")
+    parser.add_argument("path")
+    parser.add_argument("--index", type=int, help="show the position after this many actions, the end by default")
+    parser.add_argument("--legal", action="store_true", help="also check every action is legal")
+    parser.add_argument("--benchmark", action="store_true", help="report how fast the record replays")
+    args = parser.parse_args(argv)
+
+    record = GameRecord.load(args.path)
+    replay = Replay(record, check_legal=args.legal)
+    index = len(record) if args.index is None else min(args.index, len(record))
+
+    try:
+        for number in range(index):
+            action = record.actions[number]
+            replay.step()
+            print(f"{number:>4} {action.piece_name:>8} {action.origin or 'drop'} -> {action.target}"
+                  f"{' capture' if record.captures[number] else ''}")
+    except RecordError as e:
+        print(f"Invalid record: {e}")
+        return 1
+
+    state = replay.to_state()
+    print(format_board(state.board))
+    print(f"After {replay.index} of {len(record)} actions, player {state.current_player} to move"
+          + (f", player {state.winner} won" if state.winner is not None else ""))
+
+    if args.benchmark and len(record):
+        replay = Replay(record)
+        actions = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 1.0:
+            # Restart from the first checkpoint so every action is applied again
+            replay.seek(0)
+            while replay.step():
+                actions += 1
+        elapsed = time.perf_counter() - start
+        print(f"Replayed {actions} actions at {actions / elapsed:.0f} actions/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
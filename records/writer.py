@@ -0,0 +1,47 @@
+import os
+import time
+from constants import RECORDS_DIR
+from records.format import encode_header, encode_action
+
+
+class RecordWriter:
+    """Appends the actions of one game to a record file as they are played.
+
+    Each action is flushed straight away, so a crash or a closed window still
+    leaves a readable record of everything up to that point.
+    """
+
+    def __init__(self, path, size, piece_counts=None):
+        self.path = path
+        self.size = size
+        self.actions_written = 0
+        self._file = open(path, "wb")
+        self._file.write(encode_header(size, piece_counts))
+        self._file.flush()
+
+    @classmethod
+    def create(cls, size, piece_counts=None, directory=RECORDS_DIR):
+        """Writer for a new record in directory, named after the time the game started"""
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(directory, f"{stamp}_{size}x{size}.sjr")
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(directory, f"{stamp}_{size}x{size}_{suffix}.sjr")
+        return cls(path, size, piece_counts)
+
+    def record(self, action, captured=False):
+        self._file.write(encode_action(action, self.size, captured))
+        self._file.flush()
+        self.actions_written += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,55 +1,84 @@
 from constants import *
-from piece import Piece
-import pygame
+from piece import Piece, movement_for
+from zobrist import reserve_key
 
 
 class ReserveManager:
 
-    def __init__(self):
+    def __init__(self, piece_counts=None):
+        # Starting pieces per type, see PIECE_COUNTS
+        self.piece_counts = dict(PIECE_COUNTS, **(piece_counts or {}))
+
         # Initialize reserve pieces for both players
         self.reserves = {
             PLAYER_1: [],
             PLAYER_2: []
         }
         self.selected_piece = None
+        self._reset_counts()
         self.initialize_reserves()
 
+    def _reset_counts(self):
+        # Pieces per (player, name), kept alongside the lists so the Zobrist key
+        # can be updated without counting
+        self.counts = {}
+        self.zobrist = 0
+
     def reset_reserves(self):
         self.reserves = {
             PLAYER_1: [],
             PLAYER_2: []
         }
+        self._reset_counts()
         self.initialize_reserves()
 
+    def load_reserves(self, reserves):
+        """Replace both reserves, e.g. with ones received over the network"""
+        self.reserves = {player: [] for player in reserves}
+        self._reset_counts()
+        for player, pieces in reserves.items():
+            for piece in pieces:
+                self.insert_piece(player, len(self.reserves[player]), piece)
+
+    def _count_added(self, player, name):
+        count = self.counts.get((player, name), 0) + 1
+        self.counts[player, name] = count
+        self.zobrist ^= reserve_key(player, name, count)
+
+    def _count_removed(self, player, name):
+        count = self.counts[player, name]
+        self.counts[player, name] = count - 1
+        self.zobrist ^= reserve_key(player, name, count)
+
     def initialize_reserves(self):
         for player in [PLAYER_1, PLAYER_2]:
             # Add advisors (2 squares diagonally)
-            for _ in range(ADVISOR_NUMBER):
-                self.reserves[player].append(
-                    Piece("advisor", [(3, 3), (3, -3), (-3, 3), (-3, -3), (2, 2), (2, -2), (-2, 2), (-2, -2), (1, 1), (1, -1), (-1, 1), (-1, -1)], player)
+            for _ in range(self.piece_counts["advisor"]):
+                self.add_piece(
+                    Piece("advisor", movement_for("advisor"), player)
                 )
 
             # Add officials (1 square orthogonally)
-            for _ in range(OFFICIAL_NUMBER):
-                self.reserves[player].append(
-                    Piece("official", [(0, 1), (0, -1), (1, 0), (-1, 0)], player)
+            for _ in range(self.piece_counts["official"]):
+                self.add_piece(
+                    Piece("official", movement_for("official"), player)
                 )
 
             # Add palace pieces
-            for _ in range(PALACE_NUMBER):
-                self.reserves[player].append(
-                    Piece("palace", [], player)
+            for _ in range(self.piece_counts["palace"]):
+                self.add_piece(
+                    Piece("palace", movement_for("palace"), player)
                 )
 
             # Add monarch (same as official - 1 square orthogonally)
             for _ in range(1):
-                self.reserves[player].append(
-                    Piece("monarch", [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)], player)
+                self.add_piece(
+                    Piece("monarch", movement_for("monarch"), player)
                 )
 
-            for _ in range(1):
-                self.reserves[player].append(
-                    Piece("spy", [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)], player)
+            for _ in range(self.piece_counts["spy"]):
+                self.add_piece(
+                    Piece("spy", movement_for("spy"), player)
                 )
 
     def get_pieces(self, player):
@@ -61,14 +90,22 @@ class ReserveManager:
     def remove_piece(self, player, piece_index):
         """Remove a piece from reserve when it's placed on the board"""
         if 0 <= piece_index < len(self.reserves[player]):
-            return self.reserves[player].pop(piece_index)
+            piece = self.reserves[player].pop(piece_index)
+            self._count_removed(player, piece.name)
+            return piece
         return None
 
     def add_piece(self, piece):
-        self.reserves[piece.owner].append(piece)
+        self.insert_piece(piece.owner, len(self.reserves[piece.owner]), piece)
+
+    def insert_piece(self, player, piece_index, piece):
+        self.reserves[player].insert(piece_index, piece)
+        self._count_added(player, piece.name)
 
     def is_click_in_reserve(self, player, mouse_pos, display_manager):
         """Convert screen coordinates to reserve area check"""
+        import pygame
+
         current_width, current_height = display_manager.get_dimensions()
 
         # Calculate board rect for reference
@@ -97,6 +134,8 @@ class ReserveManager:
         return reserve_rect
 
     def get_piece_at_position(self, player, click_x, click_y, current_width, current_height):
+        import pygame
+
         pieces = self.get_pieces(player)
         if not pieces:
             return None
@@ -0,0 +1,237 @@
+"""Rooms, so one server process can host many games at once.
+
+A client picks a room by sending {"join": CODE}, which creates the room if nobody is
+in it, or {"join": null} for a new room with a fresh code. The server answers
+{"joined": CODE}, or {"error": ...} and closes the connection if the room is full or
+the code isn't valid. Game states are only forwarded to the other members of the
+sender's room.
+
+The server also keeps each room's game so anyone can catch up: the latest
+snapshot a member sent and every action since (see protocol.py for the messages).
+It numbers the game, accepting only the action after the last one it has and
+sending everything it holds to a client that is behind, asks for a resync or
+joins a room with a game under way. A stored binary snapshot is turned back into
+JSON for a client that didn't negotiate the binary format.
+
+Clients from before rooms never send a join. Every connection starts out in
+DEFAULT_ROOM if it has space, so two of them pointed at the same server still play
+each other, and a client that sends a game state without having a room is closed,
+like the third client used to be.
+"""
+import random
+import string
+import wire_format
+from protocol import encode_message, message_type, snapshot_message, to_json_frame
+
+DEFAULT_ROOM = "default"
+ROOM_SIZE = 2
+CODE_LENGTH = 5
+MAX_CODE_LENGTH = 16
+# No 0/O or 1/I, codes get read out loud
+CODE_ALPHABET = "".join(c for c in string.ascii_uppercase + string.digits if c not in "01IO")
+
+
+class RoomFull(Exception):
+    pass
+
+
+def normalise_code(code) -> str:
+    """Room codes are case-insensitive letters and digits, raises ValueError for anything else"""
+    if not isinstance(code, str):
+        raise ValueError("Room code must be a string")
+    code = code.strip().upper()
+    if not code or len(code) > MAX_CODE_LENGTH or not code.isalnum() or not code.isascii():
+        raise ValueError(f"Invalid room code {code!r}")
+    return code
+
+
+def is_join_message(message) -> bool:
+    return isinstance(message, dict) and "join" in message
+
+
+def join_message(code=None) -> dict:
+    return {"join": code}
+
+
+class Room:
+    def __init__(self, code):
+        self.code = code
+        self.members = []
+        # Last whole game state received from each member that doesn't send actions
+        self.game_states = {}
+        # Actions played so far, the latest snapshot frame and how many actions it
+        # includes, and the frames of the actions after it as (seq, frame)
+        self.seq = 0
+        self.snapshot = None
+        self.snapshot_seq = 0
+        self.actions = []
+        # Who played the last action, the only member whose checkpoint of it can be trusted
+        self.last_mover = None
+
+    def peers(self, client):
+        """Every member but client"""
+        return [member for member in self.members if member is not client]
+
+    def history(self, binary=False) -> list[bytes]:
+        """Frames that bring a client from any position to the room's current one, none for a new game.
+
+        The snapshot is turned into JSON unless the client reads binary snapshots.
+        """
+        if not self.seq:
+            return []
+        if self.snapshot is None:
+            snapshot = encode_message(snapshot_message(0, None))
+        else:
+            snapshot = self.snapshot if binary else to_json_frame(self.snapshot)
+        return [snapshot] + [frame for _, frame in self.actions]
+
+    def add_action(self, client, seq, frame) -> bool:
+        """Store the next action, False if seq isn't the one after the last"""
+        if not isinstance(seq, int) or seq != self.seq + 1:
+            return False
+        self.seq = seq
+        self.actions.append((seq, frame))
+        self.last_mover = client
+        return True
+
+    def add_snapshot(self, client, seq, frame) -> bool:
+        """Store a snapshot, True if it replaced the game (a new one started) and should be forwarded.
+
+        A snapshot numbered one past the last action is a new game. One taken right after
+        the last action, by whoever played it, is a checkpoint the actions before it can be
+        dropped for.
+        """
+        if seq == self.seq + 1:
+            self.seq = seq
+            self.snapshot, self.snapshot_seq, self.actions = frame, seq, []
+            self.last_mover = client
+            return True
+        if seq == self.seq and client is self.last_mover:
+            self.snapshot, self.snapshot_seq, self.actions = frame, seq, []
+        return False
+
+
+class RoomRegistry:
+    """Which room each client is in. Not thread-safe, the threaded server locks around it"""
+
+    def __init__(self, room_size=ROOM_SIZE, rng=None):
+        self.room_size = room_size
+        self.rooms = {}
+        self._room_of = {}
+        # Binary snapshot version agreed with each client that sent a hello
+        self.wire_formats = {}
+        self._rng = rng or random.SystemRandom()
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def _new_code(self):
+        while True:
+            code = "".join(self._rng.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+            if code not in self.rooms:
+                return code
+
+    def join(self, client, code=None) -> Room:
+        """Put client in the room with code, creating it if needed, or in a new room if code is None.
+
+        Leaves the client's current room first. Raises RoomFull, or ValueError for a bad code.
+        """
+        code = self._new_code() if code is None else code
+        if code != DEFAULT_ROOM:
+            code = normalise_code(code)
+        room = self.rooms.get(code)
+        if room is not None and client in room.members:
+            return room
+        if room is not None and len(room.members) >= self.room_size:
+            raise RoomFull(f"Room {code} is full")
+
+        self.leave(client)
+        if room is None:
+            room = self.rooms[code] = Room(code)
+        room.members.append(client)
+        self._room_of[client] = room
+        return room
+
+    def handle_join(self, client, code) -> dict:
+        """Reply to a join message from client"""
+        try:
+            room = self.join(client, code)
+        except (RoomFull, ValueError) as e:
+            return {"error": str(e)}
+        return {"joined": room.code}
+
+    def handle_message(self, client, message, frame):
+        """Route one message from client: (frames for its room's other members, frames back to it, keep open).
+
+        frame is the message as it arrived, forwarded without encoding it again.
+        """
+        if is_join_message(message):
+            reply = self.handle_join(client, message["join"])
+            if "error" in reply:
+                return b"", [encode_message(reply)], False
+            return b"", [encode_message(reply)] + self.history_for(client), True
+
+        if message_type(message) == "hello":
+            versions = message.get("wire_formats")
+            # Anything but a list of versions means the client only reads JSON
+            supported = isinstance(versions, list) and wire_format.VERSION in versions
+            self.wire_formats[client] = wire_format.VERSION if supported else None
+            return b"", [encode_message({"type": "hello", "wire_format": self.wire_formats[client]})], True
+
+        room = self._room_of.get(client)
+        if room is None:
+            # No room of its own and the default one is full
+            return b"", [encode_message({"error": "Game full"})], False
+
+        kind = message_type(message)
+        if kind == "action":
+            if not room.add_action(client, message.get("seq"), frame):
+                # The client is behind or ahead of the room, catch it up instead
+                return b"", self.history_for(client), True
+            return frame, [], True
+        if kind == "snapshot":
+            if isinstance(message.get("seq"), int) and room.add_snapshot(client, message["seq"], frame):
+                # Peers may not read binary snapshots
+                return to_json_frame(frame), [], True
+            return b"", [], True
+        if kind == "resync":
+            return b"", self.history_for(client), True
+
+        if not isinstance(message, dict):
+            # Not a game state either, e.g. a bare null, nothing a peer could use
+            return b"", [], True
+        room.game_states[client] = message
+        return frame, [], True
+
+    def history_for(self, client) -> list[bytes]:
+        """Room.history of client's room, in the format client reads"""
+        room = self._room_of.get(client)
+        if room is None:
+            return []
+        return room.history(binary=self.wire_formats.get(client) is not None)
+
+    def join_default(self, client):
+        """Where a new connection starts: DEFAULT_ROOM, or no room at all if it's full"""
+        try:
+            return self.join(client, DEFAULT_ROOM)
+        except RoomFull:
+            return None
+
+    def leave(self, client):
+        """Take client out of its room, removing the room once it's empty"""
+        room = self._room_of.pop(client, None)
+        if room is None:
+            return None
+        room.members.remove(client)
+        room.game_states.pop(client, None)
+        if not room.members:
+            del self.rooms[room.code]
+        return room
+
+    def disconnect(self, client):
+        """Forget everything about a closed connection"""
+        self.wire_formats.pop(client, None)
+        return self.leave(client)
+
+    def room_of(self, client):
+        return self._room_of.get(client)
@@ -0,0 +1,6 @@
+"""Seiji rules without pygame: game state, moves and the functions to enumerate and play them."""
+from move import Move
+from rules.state import GameState
+from rules.engine import generate_all_actions, legal_actions, apply, undo
+
+__all__ = ["GameState", "Move", "generate_all_actions", "legal_actions", "apply", "undo"]
@@ -0,0 +1,64 @@
+from move import Move
+from movement_patterns import get_valid_moves, get_valid_placement_squares
+from bitboard import iter_bits
+
+
+def legal_actions(state):
+    """Every move available to the side to move, none once the game is won"""
+    if state.winner is not None:
+        return []
+    return generate_all_actions(state)
+
+
+def generate_all_actions(state):
+    """Every drop, monarch placement and board move for the side to move, drops first.
+
+    The order only depends on the position, which keeps perft counts and searches
+    reproducible.
+    """
+    board = state.board
+    player = state.current_player
+    actions = []
+
+    # One set of drops per piece type in the reserve
+    seen = set()
+    for piece in state.reserve_manager.get_pieces(player):
+        if piece.name in seen:
+            continue
+        seen.add(piece.name)
+        # Monarchs have to be placed before anything else
+        if state.game_phase == "monarch_placement" and piece.name != "monarch":
+            continue
+        for square in get_valid_placement_squares(board, piece):
+            # Placement squares include enemy pieces, which can't be dropped on
+            if board.get_piece(square) is None:
+                actions.append(Move(piece.name, square))
+
+    if state.game_phase == "monarch_placement":
+        return actions
+
+    size = board.size
+    for index in iter_bits(board.get_owner_mask(player)):
+        x, y = index % size, index // size
+        piece = board.board[y][x]
+        for target in get_valid_moves(piece, x, y, board):
+            actions.append(Move(piece.name, target, (x, y)))
+
+    return actions
+
+
+def apply(state, action):
+    """Play an action on state in place and return state. undo() takes it back."""
+    player = state.current_player
+    captured = state.board.make_move(action)
+    if captured is not None and captured.name == "monarch":
+        state.winner = player
+    return state
+
+
+def undo(state):
+    """Take back the last applied action"""
+    # Nothing can be played after a win, so a winner always comes from the last action
+    state.winner = None
+    state.board.unmake_move()
+    return state
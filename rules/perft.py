@@ -0,0 +1,111 @@
+"""Perft: count the leaf nodes of the full game tree to a fixed depth.
+
+Counts from fixed positions are checked against rules/perft_golden.json, so any
+change to the move generator that alters the rules shows up as a mismatch. The
+nodes/second figure is the throughput number to track when optimising it.
+
+Run from the repository root:  python -m rules.perft [--update] [--positions NAME ...]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from move import Move
+from rules.engine import legal_actions, apply, undo
+from rules.state import GameState
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "perft_golden.json")
+
+
+def perft(state, depth) -> int:
+    if depth == 0:
+        return 1
+    actions = legal_actions(state)
+    if depth == 1:
+        return len(actions)
+
+    nodes = 0
+    for action in actions:
+        apply(state, action)
+        nodes += perft(state, depth - 1)
+        undo(state)
+    return nodes
+
+
+def divide(state, depth) -> dict:
+    """Leaf count below each root action, for tracking down a mismatch"""
+    counts = {}
+    for action in legal_actions(state):
+        apply(state, action)
+        counts[action] = perft(state, depth - 1)
+        undo(state)
+    return counts
+
+
+def build_position(size, moves) -> GameState:
+    state = GameState(size)
+    for name, target, origin in moves:
+        apply(state, Move(name, tuple(target), tuple(origin) if origin is not None else None))
+    return state
+
+
+def load_golden(path=GOLDEN_PATH) -> list:
+    with open(path) as golden_file:
+        return json.load(golden_file)["positions"]
+
+
+def run(positions, update=False) -> bool:
+    all_match = True
+    total_nodes = 0
+    total_time = 0.0
+    print(f"{'position':<16} {'size':>4} {'depth':>5} {'nodes':>10} {'seconds':>8} {'nodes/s':>10}")
+
+    for position in positions:
+        state = build_position(position["size"], position["moves"])
+        counts = []
+        for depth in range(1, position["depth"] + 1):
+            start = time.perf_counter()
+            nodes = perft(state, depth)
+            elapsed = time.perf_counter() - start
+            counts.append(nodes)
+            total_nodes += nodes
+            total_time += elapsed
+
+            status = ""
+            expected = position.get("counts", [])
+            if not update:
+                if depth > len(expected):
+                    status = "no golden value"
+                elif nodes != expected[depth - 1]:
+                    status = f"MISMATCH, expected {expected[depth - 1]}"
+                    all_match = False
+            print(f"{position['name']:<16} {position['size']:>4} {depth:>5} {nodes:>10} "
+                  f"{elapsed:>8.3f} {nodes / max(elapsed, 1e-9):>10.0f} {status}")
+        if update:
+            position["counts"] = counts
+
+    print(f"Total: {total_nodes} nodes in {total_time:.2f}s, {total_nodes / max(total_time, 1e-9):.0f} nodes/s")
+    return all_match
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count game tree leaves from fixed Seiji positions")
+    parser.add_argument("--update", action="store_true", help="rewrite the golden counts with the current results")
+    parser.add_argument("--positions", nargs="*", help="only run the named positions")
+    args = parser.parse_args(argv)
+
+    positions = load_golden()
+    selected = [p for p in positions if not args.positions or p["name"] in args.positions]
+    ok = run(selected, update=args.update)
+
+    if args.update:
+        with open(GOLDEN_PATH, "w") as golden_file:
+            json.dump({"positions": positions}, golden_file, indent=1)
+            golden_file.write("\n")
+        print(f"Updated {GOLDEN_PATH}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+from board import Board
+from constants import *
+from piece import Piece
+from reserve_manager import ReserveManager
+from zobrist import position_key
+
+
+class GameState:
+    """Everything needed to play on from a position, with no display attached.
+
+    Exposes the same attributes Board.make_move reads from a Game, so the board's
+    make/unmake works the same whether it belongs to the GUI or to a GameState.
+    winner is the player who captured the opposing monarch.
+    """
+
+    def __init__(self, size=BOARD_SIZE, piece_counts=None):
+        self.board = Board(size, self)
+        self.reserve_manager = ReserveManager(piece_counts)
+        self.current_player = PLAYER_1
+        self.game_phase = "monarch_placement"
+        self.monarchs_placed = {PLAYER_1: False, PLAYER_2: False}
+        self.winner = None
+
+    @property
+    def size(self) -> int:
+        return self.board.size
+
+    def key(self) -> int:
+        return position_key(self.board, self.reserve_manager, self.current_player, self.game_phase)
+
+    def copy(self):
+        """Independent copy of the position, without the undo history"""
+        return self.from_game(self)
+
+    @classmethod
+    def from_game(cls, game):
+        """Snapshot the position of a Game (or another GameState) into new pieces"""
+        state = cls(game.board.size, game.reserve_manager.piece_counts)
+        state.board.load_grid([[_copy_piece(piece) for piece in row] for row in game.board.board])
+        state.reserve_manager.load_reserves({
+            player: [_copy_piece(piece) for piece in pieces]
+            for player, pieces in game.reserve_manager.reserves.items()
+        })
+        # Settle anything the source hadn't checked yet, so make/unmake stay exact from here
+        state.board.check_all_pieces_status()
+
+        state.current_player = game.current_player
+        state.game_phase = game.game_phase
+        state.monarchs_placed = dict(game.monarchs_placed)
+        if isinstance(game, GameState):
+            state.winner = game.winner
+        return state
+
+
+def _copy_piece(piece):
+    if piece is None:
+        return None
+    return Piece(piece.name, piece.movement_squares, piece.owner, piece.promoted)
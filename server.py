@@ -1,56 +1,51 @@
+import argparse
+import asyncio
 import socket
 import threading
-import json
 import queue
+from protocol import FrameDecoder, ProtocolError, READ_SIZE, decode_message, encode_frame
+from rooms import RoomRegistry, is_join_message
+
+# A peer that has this much unsent data is too slow to keep up and gets dropped
+MAX_PENDING_BYTES = 1 << 20
 
 
 class GameServer:
     def __init__(self):
-        self.clients = []  # List to store client connections
-        self.game_states = {}  # Dictionary to store game states for each client
+        self.rooms = RoomRegistry()  # Which game each client connection is in, see rooms.py
         self.lock = threading.Lock()
 
     def handle_client(self, conn, addr):
         print(f"New client connected: {addr}")
 
-        with self.lock:
-            self.clients.append(conn)
-            client_id = len(self.clients) - 1
-        print(f"Assigned client ID: {client_id}")
-
+        decoder = FrameDecoder()
         try:
+            # Every send to a client happens under the lock, so frames from two threads never interleave
+            with self.lock:
+                room = self.rooms.join_default(conn)
+                history = self.rooms.history_for(conn)
+                if history:
+                    conn.sendall(b"".join(history))
+            print(f"Client {addr} starts in room {room.code if room else 'none'}")
+
             while True:
                 try:
-                    data = conn.recv(4096)
+                    data = conn.recv(READ_SIZE)
                     if not data:
                         print(f"Client {addr} disconnected gracefully")
                         break
 
                     print(f"Received {len(data)} bytes from client {addr}")
-                    game_state = json.loads(data.decode())
-
-                    with self.lock:
-                        self.game_states[client_id] = game_state
-                        # Broadcast to other clients
-                        for i, client in enumerate(self.clients):
-                            if i != client_id:
-                                try:
-                                    print(f"Sending update to client {i}")
-                                    client.send(data)
-                                    print(f"Successfully sent to client {i}")
-                                except socket.error as e:
-                                    print(f"Failed to send to client {i}: {str(e)}")
-                                    # Remove dead client
-                                    self.clients.remove(client)
-                                    if i in self.game_states:
-                                        del self.game_states[i]
+                    # One read can hold several messages, or only part of one
+                    if not all(self.handle_frame(conn, addr, payload) for payload in decoder.feed(data)):
+                        break
 
                 except socket.error as e:
                     print(f"Socket error with client {addr}: {str(e)}")
                     break
-                except json.JSONDecodeError as e:
-                    print(f"Invalid JSON from client {addr}: {str(e)}")
-                    continue
+                except ProtocolError as e:
+                    print(f"Broken stream from client {addr}: {str(e)}")
+                    break
                 except Exception as e:
                     print(f"Unexpected error handling client {addr}: {str(e)}")
                     break
@@ -58,13 +53,36 @@ class GameServer:
         finally:
             print(f"Cleaning up connection for client {addr}")
             with self.lock:
-                if conn in self.clients:
-                    self.clients.remove(conn)
-                if client_id in self.game_states:
-                    del self.game_states[client_id]
+                self.rooms.disconnect(conn)
             conn.close()
             print(f"Cleaned up client {addr}")
 
+    def handle_frame(self, conn, addr, payload):
+        """Act on one message from a client, returning False if its connection should close"""
+        try:
+            message = decode_message(payload)
+        except ValueError as e:
+            print(f"Invalid message from client {addr}: {str(e)}")
+            return True
+
+        with self.lock:
+            to_peers, replies, keep_open = self.rooms.handle_message(conn, message, encode_frame(payload))
+            room = self.rooms.room_of(conn)
+            if to_peers and room is not None:
+                # Broadcast to the rest of the room
+                for client in room.peers(conn):
+                    try:
+                        client.sendall(to_peers)
+                    except socket.error as e:
+                        print(f"Failed to send to a client in room {room.code}: {str(e)}")
+                        # Remove dead client
+                        self.rooms.disconnect(client)
+            if replies:
+                conn.sendall(b"".join(replies))
+        if not keep_open:
+            print(f"Closing client {addr}")
+        return keep_open
+
     def start(self, host='0.0.0.0', port=5555):
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
@@ -77,15 +95,8 @@ class GameServer:
                 try:
                     conn, addr = server.accept()
                     print(f"New connection from {addr}")
-
-                    # Only allow 2 players
-                    if len(self.clients) < 2:
-                        thread = threading.Thread(target=self.handle_client, args=(conn, addr))
-                        thread.start()
-                        print(f"Active connections: {len(self.clients)}")
-                    else:
-                        print(f"Rejected connection from {addr}: game full")
-                        conn.close()
+                    thread = threading.Thread(target=self.handle_client, args=(conn, addr))
+                    thread.start()
                 except socket.error as e:
                     print(f"Error accepting connection: {e}")
                     continue
@@ -97,6 +108,117 @@ class GameServer:
             server.close()
 
 
+class AsyncGameServer:
+    """GameServer's protocol on a single asyncio event loop, a coroutine per connection instead of a thread.
+
+    Every message is decoded and routed through the same RoomRegistry
+    as GameServer's. Nothing blocks on a slow peer:
+    broadcasts only queue data on each transport.
+    """
+
+    def __init__(self):
+        self.rooms = RoomRegistry()  # Which game each StreamWriter is in, see rooms.py
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print(f"New connection from {addr}")
+
+        room = self.rooms.join_default(writer)
+        print(f"Client {addr} starts in room {room.code if room else 'none'}, {len(self.rooms)} rooms open")
+        if room is not None and room.seq:
+            # A game is under way, catch the newcomer up
+            writer.write(b"".join(self.rooms.history_for(writer)))
+
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    print(f"Client {addr} disconnected gracefully")
+                    break
+                if not self.handle_frames(writer, addr, decoder.feed(data)):
+                    break
+
+        except ProtocolError as e:
+            print(f"Broken stream from client {addr}: {str(e)}")
+        except (ConnectionError, OSError) as e:
+            print(f"Socket error with client {addr}: {str(e)}")
+        finally:
+            self._drop(writer)
+            print(f"Cleaned up client {addr}")
+
+    def handle_frames(self, writer, addr, payloads):
+        """Act on the messages of one read, returning False if the connection should close.
+
+        Whatever they send on to the room goes out together, one write per peer.
+        """
+        forward = []
+        for payload in payloads:
+            try:
+                message = decode_message(payload)
+            except ValueError as e:
+                print(f"Invalid message from client {addr}: {str(e)}")
+                continue
+
+            if is_join_message(message):
+                # What came before the join belongs to the old room
+                self._forward(writer, forward)
+                forward = []
+            to_peers, replies, keep_open = self.rooms.handle_message(writer, message, encode_frame(payload))
+            if to_peers:
+                forward.append(to_peers)
+            if replies:
+                writer.write(b"".join(replies))
+            if not keep_open:
+                print(f"Closing client {addr}")
+                return False
+        self._forward(writer, forward)
+        return True
+
+    def _forward(self, writer, frames):
+        room = self.rooms.room_of(writer)
+        if frames and room is not None:
+            self.broadcast(room, writer, b"".join(frames))
+
+    def broadcast(self, room, sender, data):
+        """Queue data for every member of room but the sender"""
+        for client in room.peers(sender):
+            if client.is_closing() or client.transport.get_write_buffer_size() > MAX_PENDING_BYTES:
+                print(f"Dropping client {client.get_extra_info('peername')}: not keeping up")
+                self._drop(client)
+                continue
+            client.write(data)
+
+    def _drop(self, writer):
+        self.rooms.disconnect(writer)
+        writer.close()
+
+    async def serve(self, host='0.0.0.0', port=5555):
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+        print(f"Server is listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def start(self, host='0.0.0.0', port=5555):
+        """Run the event loop in the calling thread until the server stops"""
+        try:
+            asyncio.run(self.serve(host, port))
+        except Exception as e:
+            print(f"Server error: {e}")
+        finally:
+            print("Server shutting down...")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Seiji game server")
+    parser.add_argument("--host", default='0.0.0.0')
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--threaded", action="store_true", help="use the thread-per-client server")
+    args = parser.parse_args(argv)
+
+    server = GameServer() if args.threaded else AsyncGameServer()
+    server.start(host=args.host, port=args.port)
+
+
 if __name__ == "__main__":
-    server = GameServer()
-    server.start(host='0.0.0.0', port=5555)
+    main()
@@ -0,0 +1,58 @@
+import pytest
+from protocol import (LENGTH, MAX_FRAME_SIZE, FrameDecoder, ProtocolError, decode_message, encode_frame,
+                      encode_message)
+
+
+def test_frame_is_length_prefixed():
+    assert encode_frame(b"abc") == b"\x00\x00\x00\x03abc"
+    assert encode_frame(b"") == b"\x00\x00\x00\x00"
+
+
+def test_message_round_trip():
+    message = {"join": "ROOM", "list": [1, 2, None]}
+    frame = encode_message(message)
+    (length,) = LENGTH.unpack_from(frame)
+    assert length == len(frame) - LENGTH.size
+    assert decode_message(frame[LENGTH.size:]) == message
+
+
+def test_decode_message_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_message(b"{not json")
+    with pytest.raises(ValueError):
+        decode_message(b"\xff\xfe")
+
+
+def test_several_frames_in_one_read():
+    data = encode_frame(b"one") + encode_frame(b"") + encode_frame(b"three")
+    assert FrameDecoder().feed(data) == [b"one", b"", b"three"]
+
+
+def test_frame_split_over_reads():
+    data = encode_frame(b"hello") + encode_frame(b"world")
+    decoder = FrameDecoder()
+    frames = []
+    # One byte at a time, splitting inside both the length and the payload
+    for i in range(len(data)):
+        frames += decoder.feed(data[i:i + 1])
+    assert frames == [b"hello", b"world"]
+    assert len(decoder) == 0
+
+
+def test_partial_frame_stays_buffered():
+    decoder = FrameDecoder()
+    data = encode_frame(b"payload")
+    assert decoder.feed(data[:6]) == []
+    assert len(decoder) == 6
+    assert decoder.feed(data[6:] + data[:2]) == [b"payload"]
+    assert len(decoder) == 2
+
+
+def test_oversized_frame_is_refused():
+    with pytest.raises(ProtocolError):
+        encode_frame(bytes(MAX_FRAME_SIZE + 1))
+    with pytest.raises(ProtocolError):
+        FrameDecoder().feed(LENGTH.pack(MAX_FRAME_SIZE + 1))
+    with pytest.raises(ProtocolError):
+        FrameDecoder(max_frame_size=4).feed(encode_frame(b"12345"))
+    assert FrameDecoder(max_frame_size=4).feed(encode_frame(b"1234")) == [b"1234"]
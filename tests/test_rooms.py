@@ -0,0 +1,208 @@
+import random
+import pytest
+import wire_format
+from protocol import RESYNC, decode_message, encode_message, encode_snapshot, snapshot_message
+from rooms import DEFAULT_ROOM, Room, RoomFull, RoomRegistry, normalise_code
+
+
+def _action(seq):
+    return {"type": "action", "seq": seq, "action": [0, 0, 0], "key": 0}
+
+
+def _messages(frames):
+    return [decode_message(frame[4:]) for frame in frames]
+
+
+def test_join_creates_room_and_fills_it():
+    rooms = RoomRegistry()
+    room = rooms.join("a", "abc")
+    assert room.code == "ABC"
+    assert rooms.join("b", "ABC") is room
+    assert room.members == ["a", "b"]
+    with pytest.raises(RoomFull):
+        rooms.join("c", "abc")
+    assert rooms.room_of("c") is None
+
+
+def test_join_without_code_makes_a_new_room():
+    rooms = RoomRegistry(rng=random.Random(0))
+    first = rooms.join("a")
+    second = rooms.join("b")
+    assert first is not second
+    assert len(rooms) == 2
+
+
+def test_rejoining_the_same_room_keeps_the_client_once():
+    rooms = RoomRegistry()
+    room = rooms.join("a", "X")
+    assert rooms.join("a", "x") is room
+    assert room.members == ["a"]
+
+
+def test_switching_rooms_leaves_the_old_one():
+    rooms = RoomRegistry()
+    rooms.join("a", "OLD")
+    rooms.join("a", "NEW")
+    assert "OLD" not in rooms.rooms
+    assert rooms.room_of("a").code == "NEW"
+
+
+def test_leave_removes_empty_rooms_only():
+    rooms = RoomRegistry()
+    room = rooms.join("a", "X")
+    rooms.join("b", "X")
+    room.game_states["a"] = {}
+    assert rooms.leave("a") is room
+    assert room.game_states == {}
+    assert "X" in rooms.rooms
+    rooms.leave("b")
+    assert len(rooms) == 0
+    assert rooms.leave("b") is None
+
+
+def test_join_default_is_none_once_full():
+    rooms = RoomRegistry()
+    assert rooms.join_default("a").code == DEFAULT_ROOM
+    assert rooms.join_default("b").code == DEFAULT_ROOM
+    assert rooms.join_default("c") is None
+
+
+def test_handle_join_reports_errors():
+    rooms = RoomRegistry(room_size=1)
+    assert rooms.handle_join("a", "room1") == {"joined": "ROOM1"}
+    assert "error" in rooms.handle_join("b", "room1")
+    assert "error" in rooms.handle_join("b", "not a code")
+    assert "error" in rooms.handle_join("b", 5)
+
+
+@pytest.mark.parametrize("code", ["", "   ", "a-b", "x" * 17, "café", None])
+def test_normalise_code_rejects_bad_codes(code):
+    with pytest.raises(ValueError):
+        normalise_code(code)
+
+
+def test_add_action_only_takes_the_next_seq():
+    room = Room("X")
+    assert room.add_action("a", 1, b"1")
+    assert not room.add_action("a", 1, b"again")
+    assert not room.add_action("a", 3, b"gap")
+    assert not room.add_action("a", "2", b"not a number")
+    assert room.add_action("b", 2, b"2")
+    assert room.seq == 2
+    assert room.actions == [(1, b"1"), (2, b"2")]
+    assert room.last_mover == "b"
+
+
+def test_add_snapshot_new_game_and_checkpoint():
+    room = Room("X")
+    room.add_action("a", 1, b"1")
+    # Only whoever played the last action may checkpoint it
+    assert not room.add_snapshot("b", 1, b"stale")
+    assert room.snapshot is None and room.actions == [(1, b"1")]
+    assert not room.add_snapshot("a", 1, b"checkpoint")
+    assert (room.snapshot, room.snapshot_seq, room.actions) == (b"checkpoint", 1, [])
+    # Behind or far ahead is ignored
+    assert not room.add_snapshot("a", 0, b"old")
+    assert not room.add_snapshot("a", 5, b"ahead")
+    assert room.snapshot == b"checkpoint"
+    assert room.add_snapshot("b", 2, b"new game")
+    assert (room.seq, room.snapshot, room.last_mover) == (2, b"new game", "b")
+
+
+def test_history_of_a_new_game_starts_from_the_start_position():
+    room = Room("X")
+    assert room.history() == []
+    room.add_action("a", 1, b"1")
+    snapshot, action = room.history()
+    assert decode_message(snapshot[4:]) == snapshot_message(0, None)
+    assert action == b"1"
+
+
+def test_handle_message_routes_actions():
+    rooms = RoomRegistry()
+    rooms.join("a", "X")
+    rooms.join("b", "X")
+    frame = encode_message(_action(1))
+    assert rooms.handle_message("a", _action(1), frame) == (frame, [], True)
+    # Out of order: nothing forwarded, the sender is sent what it missed
+    to_peers, replies, keep_open = rooms.handle_message("b", _action(3), encode_message(_action(3)))
+    assert (to_peers, keep_open) == (b"", True)
+    assert _messages(replies) == [snapshot_message(0, None), _action(1)]
+    _, replies, _ = rooms.handle_message("b", RESYNC, encode_message(RESYNC))
+    assert _messages(replies) == [snapshot_message(0, None), _action(1)]
+
+
+def test_handle_message_without_a_room_closes():
+    rooms = RoomRegistry()
+    to_peers, replies, keep_open = rooms.handle_message("a", _action(1), encode_message(_action(1)))
+    assert not keep_open
+    assert "error" in _messages(replies)[0]
+
+
+def test_handle_message_join_sends_the_game_so_far():
+    rooms = RoomRegistry()
+    rooms.join("a", "X")
+    rooms.handle_message("a", _action(1), b"action 1")
+    to_peers, replies, keep_open = rooms.handle_message("b", {"join": "x"}, b"")
+    assert keep_open and to_peers == b""
+    assert decode_message(replies[0][4:]) == {"joined": "X"}
+    assert replies[2] == b"action 1"
+
+
+@pytest.mark.parametrize("message", [None, 5, True, "text", [1, 2]])
+def test_handle_message_drops_untyped_non_dicts(message):
+    rooms = RoomRegistry()
+    rooms.join("a", "X")
+    rooms.join("b", "X")
+    assert rooms.handle_message("a", message, encode_message(message)) == (b"", [], True)
+    assert rooms.room_of("a").game_states == {}
+
+
+def test_handle_message_forwards_legacy_states():
+    rooms = RoomRegistry()
+    rooms.join("a", "X")
+    state = {"board": []}
+    frame = encode_message(state)
+    assert rooms.handle_message("a", state, frame) == (frame, [], True)
+    assert rooms.room_of("a").game_states == {"a": state}
+
+
+def _hello(rooms, client, versions):
+    _, replies, keep_open = rooms.handle_message(client, {"type": "hello", "wire_formats": versions}, b"")
+    assert keep_open
+    return _messages(replies)[0]["wire_format"]
+
+
+@pytest.mark.parametrize("versions, agreed", [([wire_format.VERSION], wire_format.VERSION), ([], None),
+                                              ([wire_format.VERSION + 1], None), (None, None), (5, None),
+                                              (str(wire_format.VERSION), None), ({"1": 1}, None)])
+def test_hello_negotiates_the_binary_format(versions, agreed):
+    assert _hello(RoomRegistry(), "a", versions) == agreed
+
+
+def test_binary_snapshots_reach_json_clients_as_json():
+    rooms = RoomRegistry()
+    assert _hello(rooms, "a", [wire_format.VERSION]) == wire_format.VERSION
+    rooms.join("a", "X")
+    rooms.join("b", "X")
+    state = {"board": [[None] * 4 for _ in range(4)], "current_player": 1, "monarchs_placed": {"1": False, "2": False},
+             "game_phase": "monarch_placement", "current_state": "game", "winner": None,
+             "reserves": {"1": [], "2": []}, "i_promoted": False, "position_key": 7}
+    frame = encode_snapshot(1, state, binary=True)
+    to_peers, _, _ = rooms.handle_message("a", decode_message(frame[4:]), frame)
+    assert not wire_format.is_binary(to_peers[4:])
+    assert decode_message(to_peers[4:]) == snapshot_message(1, state)
+    # The room keeps the binary frame and hands it out as each client reads it
+    assert rooms.history_for("a") == [frame]
+    assert rooms.history_for("b") == [to_peers]
+
+
+def test_format_survives_room_changes_until_disconnect():
+    rooms = RoomRegistry()
+    _hello(rooms, "a", [wire_format.VERSION])
+    rooms.join("a", "X")
+    rooms.join("a", "Y")
+    assert rooms.wire_formats["a"] == wire_format.VERSION
+    assert rooms.disconnect("a").code == "Y"
+    assert "a" not in rooms.wire_formats
+    assert len(rooms) == 0
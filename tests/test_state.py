@@ -0,0 +1,23 @@
+from constants import PLAYER_1, PLAYER_2
+from rules.engine import legal_actions, apply
+from rules.state import GameState
+
+PIECE_COUNTS = {"advisor": 1, "official": 5, "palace": 0, "spy": 3}
+
+
+def _reserve_names(state, player):
+    return sorted(piece.name for piece in state.reserve_manager.get_pieces(player))
+
+
+def test_copy_keeps_custom_piece_counts():
+    state = GameState(9, PIECE_COUNTS)
+    for _ in range(4):
+        apply(state, legal_actions(state)[0])
+
+    copy = state.copy()
+
+    assert copy.reserve_manager.piece_counts == state.reserve_manager.piece_counts
+    for player in (PLAYER_1, PLAYER_2):
+        assert _reserve_names(copy, player) == _reserve_names(state, player)
+    assert copy.key() == state.key()
+
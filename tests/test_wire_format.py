@@ -0,0 +1,88 @@
+import json
+import random
+from types import SimpleNamespace
+import pytest
+import wire_format
+from constants import MIN_BOARD_SIZE, MAX_BOARD_SIZE, PLAYER_2
+from network_manager import NetworkManager
+from protocol import LENGTH, decode_message, encode_snapshot, to_json_frame
+from rules.engine import legal_actions, apply
+from rules.state import GameState
+from wire_format import HEADER, WireFormatError, decode_snapshot
+
+
+def _state(size, seed, plies=40):
+    """NetworkManager's dict of a game some random actions in"""
+    state = GameState(size)
+    rng = random.Random(seed)
+    for _ in range(plies):
+        actions = legal_actions(state)
+        if not actions or state.winner is not None:
+            break
+        apply(state, rng.choice(actions))
+    game = SimpleNamespace(board=state.board, reserve_manager=state.reserve_manager,
+                           current_player=state.current_player, monarchs_placed=state.monarchs_placed,
+                           game_phase=state.game_phase, current_state="game", winner=state.winner,
+                           get_position_key=state.key)
+    return NetworkManager.serialize_game_state(SimpleNamespace(game=game))
+
+
+def _as_json(value):
+    # Tuples come back as lists, as they do through JSON
+    return json.loads(json.dumps(value))
+
+
+@pytest.mark.parametrize("size", range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1))
+def test_round_trip_at_every_size(size):
+    for seed in range(3):
+        state = _state(size, seed)
+        payload = wire_format.encode_snapshot(seed + 1, state)
+        assert wire_format.is_binary(payload)
+        assert _as_json(decode_snapshot(payload)) == _as_json({"type": "snapshot", "seq": seed + 1, "state": state})
+
+
+def test_round_trip_keeps_flags_and_reserve_order():
+    state = _state(7, 1)
+    state.update(current_player=PLAYER_2, current_state="post_game", winner=PLAYER_2, i_promoted=True,
+                 position_key=None)
+    state["reserves"]["1"].reverse()
+    decoded = decode_snapshot(wire_format.encode_snapshot(3, state))["state"]
+    assert _as_json(decoded) == _as_json(state)
+
+
+def test_binary_is_smaller_than_json():
+    state = _state(19, 0)
+    assert len(encode_snapshot(1, state, binary=True)) * 5 < len(encode_snapshot(1, state))
+
+
+def test_json_fallback():
+    state = _state(9, 0)
+    frame = encode_snapshot(1, state, binary=True)
+    json_frame = to_json_frame(frame)
+    assert not wire_format.is_binary(json_frame[LENGTH.size:])
+    assert decode_message(json_frame[LENGTH.size:]) == _as_json(decode_message(frame[LENGTH.size:]))
+    # Snapshots of the start position are always JSON
+    assert not wire_format.is_binary(encode_snapshot(1, None, binary=True)[LENGTH.size:])
+
+
+def test_truncated_payloads_are_rejected():
+    payload = wire_format.encode_snapshot(1, _state(6, 0))
+    for end in range(len(payload)):
+        with pytest.raises(WireFormatError):
+            decode_snapshot(payload[:end])
+
+
+@pytest.mark.parametrize("field, value", [(0, b"XYZ"), (1, wire_format.VERSION + 1), (5, 3), (6, 9)])
+def test_corrupt_headers_are_rejected(field, value):
+    payload = wire_format.encode_snapshot(1, _state(5, 0))
+    fields = list(HEADER.unpack_from(payload))
+    fields[field] = value
+    with pytest.raises(WireFormatError):
+        decode_snapshot(HEADER.pack(*fields) + payload[HEADER.size:])
+
+
+def test_unknown_piece_code_is_rejected():
+    payload = bytearray(wire_format.encode_snapshot(1, _state(5, 0)))
+    payload[HEADER.size] = wire_format.PIECE_MASK
+    with pytest.raises(WireFormatError):
+        decode_snapshot(bytes(payload))
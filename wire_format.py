@@ -0,0 +1,166 @@
+"""Binary encoding of game snapshots, negotiated per connection with JSON as the fallback.
+
+It carries the same dict as NetworkManager.serialize_game_state, little-endian:
+
+    header    magic "SJS", version, snapshot seq (I), board size, flags,
+              current_state, winner (0 for none), position key (Q)
+    squares   size * size bytes at y * size + x, 0 for an empty square
+    reserves  per player, a piece count and then one byte per piece, in order
+
+A piece byte holds the piece type plus one in its low three bits, the owner in
+bit 3 (set for player 2), the promotion in bit 4 and, for a promoted official, bit
+5 when it was promoted by an advisor rather than a monarch. Movement sets aren't
+sent, they follow from those. Reserve pieces always belong to the player holding
+them, so their owner bit is left clear.
+
+Header flags: 0x01 player 2 to move, 0x02 and 0x04 player 1's and player 2's
+monarch placed, 0x08 playing phase, 0x10 i_promoted, 0x20 position key present.
+"""
+import struct
+from constants import PLAYER_1, PLAYER_2
+from piece import movement_for
+from zobrist import PIECE_NAMES, GAME_PHASES
+
+MAGIC = b"SJS"
+VERSION = 1
+HEADER = struct.Struct("<3sBIBBBBQ")
+
+PLAYER_2_TO_MOVE = 0x01
+PLAYER_1_MONARCH_PLACED = 0x02
+PLAYER_2_MONARCH_PLACED = 0x04
+PLAYING = 0x08
+I_PROMOTED = 0x10
+HAS_POSITION_KEY = 0x20
+
+PIECE_MASK = 0x07
+OWNER_PLAYER_2 = 0x08
+PROMOTED = 0x10
+BY_ADVISOR = 0x20
+
+CURRENT_STATES = ("menu", "game", "post_game")
+PIECE_CODES = {name: code + 1 for code, name in enumerate(PIECE_NAMES)}
+
+
+class WireFormatError(ValueError):
+    pass
+
+
+def is_binary(payload) -> bool:
+    """Whether a frame's payload is a binary snapshot rather than JSON"""
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def _piece_byte(piece_data, with_owner=True):
+    code = PIECE_CODES[piece_data["name"]]
+    if with_owner and piece_data["owner"] == PLAYER_2:
+        code |= OWNER_PLAYER_2
+    if piece_data["promoted"]:
+        code |= PROMOTED
+        # Only an official promoted by an advisor moves like this
+        if tuple(map(tuple, piece_data["movement_squares"])) == movement_for("official", "advisor"):
+            code |= BY_ADVISOR
+    return code
+
+
+def encode_snapshot(seq, state) -> bytes:
+    """A snapshot message, i.e. {"type": "snapshot", "seq": seq, "state": state}, as a frame payload"""
+    board = state["board"]
+    size = len(board)
+    monarchs_placed = state["monarchs_placed"]
+    flags = 0
+    if state["current_player"] == PLAYER_2:
+        flags |= PLAYER_2_TO_MOVE
+    if monarchs_placed.get(str(PLAYER_1)):
+        flags |= PLAYER_1_MONARCH_PLACED
+    if monarchs_placed.get(str(PLAYER_2)):
+        flags |= PLAYER_2_MONARCH_PLACED
+    if state["game_phase"] == "playing":
+        flags |= PLAYING
+    if state.get("i_promoted"):
+        flags |= I_PROMOTED
+    position_key = state.get("position_key")
+    if position_key is not None:
+        flags |= HAS_POSITION_KEY
+
+    parts = [HEADER.pack(MAGIC, VERSION, seq, size, flags, CURRENT_STATES.index(state["current_state"]),
+                         state["winner"] or 0, position_key or 0),
+             bytes(0 if piece_data is None else _piece_byte(piece_data) for row in board for piece_data in row)]
+    for player in (PLAYER_1, PLAYER_2):
+        pieces = state["reserves"].get(str(player), [])
+        parts.append(bytes([len(pieces)]))
+        parts.append(bytes(_piece_byte(piece_data, with_owner=False) for piece_data in pieces))
+    return b"".join(parts)
+
+
+def _movement(name, code):
+    if not code & PROMOTED:
+        return movement_for(name)
+    if name == "monarch":
+        return movement_for("monarch", "promoted")
+    if name == "advisor":
+        return movement_for("advisor", "monarch")
+    return movement_for("official", "advisor" if code & BY_ADVISOR else "monarch")
+
+
+def _piece_data(code, owner):
+    index = (code & PIECE_MASK) - 1
+    if not 0 <= index < len(PIECE_NAMES):
+        raise WireFormatError(f"Unknown piece code {code}")
+    name = PIECE_NAMES[index]
+    return {"name": name, "movement_squares": _movement(name, code), "owner": owner,
+            "promoted": bool(code & PROMOTED)}
+
+
+def decode_snapshot(payload) -> dict:
+    """The snapshot message encoded in a payload, raises WireFormatError if it isn't a valid one"""
+    if len(payload) < HEADER.size:
+        raise WireFormatError("Snapshot is shorter than its header")
+    magic, version, seq, size, flags, current_state, winner, position_key = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise WireFormatError("Not a binary snapshot")
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported snapshot version {version}")
+    if current_state >= len(CURRENT_STATES) or winner not in (0, PLAYER_1, PLAYER_2):
+        raise WireFormatError("Snapshot header is corrupt")
+
+    offset = HEADER.size
+    squares = payload[offset:offset + size * size]
+    if len(squares) != size * size:
+        raise WireFormatError("Snapshot is truncated")
+    offset += size * size
+    board = []
+    for y in range(size):
+        row = []
+        for x in range(size):
+            code = squares[y * size + x]
+            if code:
+                owner = PLAYER_2 if code & OWNER_PLAYER_2 else PLAYER_1
+                row.append(_piece_data(code, owner))
+            else:
+                row.append(None)
+        board.append(row)
+
+    reserves = {}
+    for player in (PLAYER_1, PLAYER_2):
+        if offset >= len(payload):
+            raise WireFormatError("Snapshot is truncated")
+        count = payload[offset]
+        codes = payload[offset + 1:offset + 1 + count]
+        if len(codes) != count:
+            raise WireFormatError("Snapshot is truncated")
+        offset += 1 + count
+        reserves[str(player)] = [_piece_data(code, player) for code in codes]
+
+    state = {
+        "board": board,
+        "current_player": PLAYER_2 if flags & PLAYER_2_TO_MOVE else PLAYER_1,
+        "monarchs_placed": {str(PLAYER_1): bool(flags & PLAYER_1_MONARCH_PLACED),
+                            str(PLAYER_2): bool(flags & PLAYER_2_MONARCH_PLACED)},
+        "game_phase": GAME_PHASES[1] if flags & PLAYING else GAME_PHASES[0],
+        "current_state": CURRENT_STATES[current_state],
+        "winner": winner or None,
+        "reserves": reserves,
+        "i_promoted": bool(flags & I_PROMOTED),
+        "position_key": position_key if flags & HAS_POSITION_KEY else None,
+    }
+    return {"type": "snapshot", "seq": seq, "state": state}
@@ -0,0 +1,50 @@
+import random
+from constants import PLAYER_1, PLAYER_2, MAX_BOARD_SIZE
+
+PIECE_NAMES = ("monarch", "advisor", "official", "palace", "spy")
+GAME_PHASES = ("monarch_placement", "playing")
+
+# Reserves never hold more pieces of one type than both starting sets combined,
+# this leaves plenty of room for changes to the piece counts
+MAX_RESERVE_COUNT = 64
+
+# Fixed seed so clients, the server and offline tools all derive the same keys
+_rng = random.Random(0x5E171)
+
+
+def _random_key():
+    return _rng.getrandbits(64)
+
+
+_PIECE_KEYS = {
+    (x, y, owner, name, promoted): _random_key()
+    for y in range(MAX_BOARD_SIZE)
+    for x in range(MAX_BOARD_SIZE)
+    for owner in (PLAYER_1, PLAYER_2)
+    for name in PIECE_NAMES
+    for promoted in (False, True)
+}
+
+_RESERVE_KEYS = {
+    (owner, name, count): _random_key()
+    for owner in (PLAYER_1, PLAYER_2)
+    for name in PIECE_NAMES
+    for count in range(1, MAX_RESERVE_COUNT + 1)
+}
+
+SIDE_KEYS = {PLAYER_1: _random_key(), PLAYER_2: _random_key()}
+PHASE_KEYS = {phase: _random_key() for phase in GAME_PHASES}
+
+
+def piece_key(x, y, owner, name, promoted) -> int:
+    return _PIECE_KEYS[x, y, owner, name, bool(promoted)]
+
+
+def reserve_key(owner, name, count) -> int:
+    """Key toggled when a player's reserve count for a piece type reaches or leaves count"""
+    return _RESERVE_KEYS[owner, name, count]
+
+
+def position_key(board, reserve_manager, current_player, game_phase) -> int:
+    """64-bit key for the full position: board, promotions, reserves, side to move and phase"""
+    return board.zobrist ^ reserve_manager.zobrist ^ SIDE_KEYS[current_player] ^ PHASE_KEYS[game_phase]